@@ -2,12 +2,19 @@ from flask import Blueprint, request, jsonify
 import bcrypt
 import jwt
 from datetime import datetime, timedelta
+import secrets
 import uuid
 
-from db import get_client, Entity
+from db import get_client, Entity, exclude_from_indexes, run_in_transaction
 from config import Config
-from models import user_to_dict
+from models import user_to_dict, match_partner_id, profile_snapshot
 from middleware import require_auth
+from calendar_feed import calendar_scope
+from counters import incoming_poke_counter, POKE_COUNTER_SHARDS
+import availability
+import counters
+import tasks
+import versions
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -55,6 +62,139 @@ def get_user_by_id(user_id):
     return client.get(key)
 
 
+def picture_url(user_id):
+    """API path serving a user's profile picture."""
+    return f'/api/auth/users/{user_id}/picture'
+
+
+def dependent_scopes(user_id, include_matches=True):
+    """Version scopes of cached lists that show this user.
+
+    Partners' poke lists, and with `include_matches` their match lists and
+    calendar feeds (which carry the pair's sessions).
+    """
+    client = get_client()
+    scopes = []
+    if include_matches:
+        q = client.query(kind='Match')
+        q.add_filter('userIds', '=', user_id)
+        for m in q.fetch():
+            partner_id = match_partner_id(m, user_id)
+            scopes.extend([f'matches:{partner_id}', calendar_scope(partner_id)])
+    q = client.query(kind='Poke')
+    q.add_filter('fromUserId', '=', user_id)
+    scopes.extend(f'pokes:{p.get("toUserId")}' for p in q.fetch())
+    return scopes
+
+
+def bump_dependent_versions(user_id, include_matches=True):
+    """Invalidate cached poke lists (and optionally match lists) that show this user's profile."""
+    versions.bump(*dependent_scopes(user_id, include_matches))
+
+
+def leave_meetups(user_id):
+    """Take a departing user out of every meetup and drop their join requests.
+
+    Meetups they host are cancelled; the others lose them as a participant.
+    Returns the IDs of everyone whose calendar feed changed. Cached meetup
+    feed pages aren't evicted here and expire on their own within seconds.
+    """
+    client = get_client()
+    q = client.query(kind='MeetupJoinRequest')
+    q.add_filter('userId', '=', user_id)
+    q.keys_only()
+    client.delete_multi([entity.key for entity in q.fetch()])
+
+    q = client.query(kind='Meetup')
+    q.add_filter('participants', '=', user_id)
+    q.keys_only()
+    affected = set()
+    for meetup_ref in q.fetch():
+        def apply(key=meetup_ref.key):
+            meetup = client.get(key)
+            if not meetup or user_id not in meetup.get('participants', []):
+                return []
+            participants = meetup.get('participants', [])
+            if meetup.get('hostId') == user_id:
+                meetup['status'] = 'cancelled'
+            else:
+                meetup['participants'] = [uid for uid in participants if uid != user_id]
+            meetup['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
+            client.put(meetup)
+            return participants
+
+        affected.update(run_in_transaction(apply))
+    affected.discard(user_id)
+    return affected
+
+
+# Kinds stored per match under a `matchId` property
+MATCH_DATA_KINDS = ['Message', 'MessageBlock', 'MessageReaction', 'Session', 'ReadState']
+
+
+def delete_match_data(match):
+    """Delete a Match with its chat, sessions, read state, activity and unread counters.
+
+    Match IDs are fixed per pair, so anything left behind would come back if
+    the same two users matched again.
+    """
+    client = get_client()
+    match_id = match.key.name or str(match.key.id)
+
+    for kind in MATCH_DATA_KINDS:
+        q = client.query(kind=kind)
+        q.add_filter('matchId', '=', match_id)
+        q.keys_only()
+        client.delete_multi([entity.key for entity in q.fetch()])
+
+    for uid in match.get('userIds') or [match.get('user1Id'), match.get('user2Id')]:
+        if uid:
+            counters.reset(counters.unread_counter(match_id, uid))
+    client.delete_multi([match.key, client.key('MatchActivity', match_id),
+                         client.key('ActiveSession', match_id)])
+
+
+def refresh_profile_snapshots(user_id):
+    """Copy the user's current profile onto every Match they are in.
+
+    Runs in the background after a profile update. Each Match is updated in
+    its own transaction and only if its snapshot is older than the profile,
+    so overlapping runs can't go backwards.
+    """
+    user = get_user_by_id(user_id)
+    if not user:
+        return 0
+    snapshot = profile_snapshot(user)
+    client = get_client()
+
+    q = client.query(kind='Match')
+    q.add_filter('userIds', '=', user_id)
+    q.keys_only()
+
+    refreshed_partners = []
+    for match_ref in q.fetch():
+        def apply(key=match_ref.key):
+            match = client.get(key)
+            if not match:
+                return None
+            profiles = dict(match.get('profiles') or {})
+            current = profiles.get(user_id) or {}
+            if (current.get('updatedAt') or '') >= snapshot['updatedAt']:
+                return None
+            profiles[user_id] = snapshot
+            match['profiles'] = profiles
+            exclude_from_indexes(match, 'profiles')
+            client.put(match)
+            return match_partner_id(match, user_id)
+
+        partner_id = run_in_transaction(apply)
+        if partner_id:
+            refreshed_partners.append(partner_id)
+
+    versions.bump(*(f'matches:{pid}' for pid in refreshed_partners))
+    return len(refreshed_partners)
+
+
 def generate_token(user_id):
     """Generate a JWT token."""
     payload = {
@@ -178,10 +318,16 @@ def get_me():
             }
         }), 404
 
-    return jsonify({
+    # updatedAt changes on every profile write, so it doubles as the version
+    etag = versions.compute_etag(request.user_id, user.get('updatedAt'), user.get('createdAt'))
+    cached = versions.not_modified(etag)
+    if cached:
+        return cached
+
+    return versions.with_etag(jsonify({
         'success': True,
         'data': user_to_dict(user)
-    })
+    }), etag)
 
 
 @auth_bp.route('/profile', methods=['PUT'])
@@ -216,11 +362,16 @@ def update_profile():
         user['collegeYear'] = data['collegeYear']
     if 'availability' in data:
         user['availability'] = data['availability']
+        user['availabilityMask'] = availability.to_hex(availability.compile_mask(data['availability']))
+        exclude_from_indexes(user, 'availabilityMask')
 
     user['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
 
     client = get_client()
     client.put(user)
+    bump_dependent_versions(request.user_id, include_matches=False)
+    # Match lists read partner snapshots; fan the new profile out to them
+    tasks.defer(refresh_profile_snapshots, request.user_id)
 
     return jsonify({
         'success': True,
@@ -235,35 +386,127 @@ def delete_account():
     user_id = request.user_id
     client = get_client()
 
-    # Delete pokes
+    # Partners' match lists, poke lists and calendars change once this user
+    # is gone; collect them before their matches and pokes are deleted
+    scopes = dependent_scopes(user_id)
+
+    # Delete pokes, taking pending outgoing ones off the recipients' badges
     for field in ['fromUserId', 'toUserId']:
         q = client.query(kind='Poke')
         q.add_filter(field, '=', user_id)
         for entity in q.fetch():
             client.delete(entity.key)
+            if field == 'fromUserId' and entity.get('status') == 'pending':
+                counters.increment(incoming_poke_counter(entity.get('toUserId')), -1,
+                                   shards=POKE_COUNTER_SHARDS)
+    counters.reset(incoming_poke_counter(user_id), shards=POKE_COUNTER_SHARDS)
 
     # Delete matches and their messages/reactions/sessions
-    for field in ['user1Id', 'user2Id']:
-        q = client.query(kind='Match')
-        q.add_filter(field, '=', user_id)
-        for match in q.fetch():
-            match_id = match.key.name or str(match.key.id)
+    q = client.query(kind='Match')
+    q.add_filter('userIds', '=', user_id)
+    for match in q.fetch():
+        delete_match_data(match)
 
-            for kind in ['Message', 'MessageReaction', 'Session']:
-                mq = client.query(kind=kind)
-                mq.add_filter('matchId', '=', match_id)
-                for entity in mq.fetch():
-                    client.delete(entity.key)
-
-            client.delete(match.key)
+    # Leave meetups; the other participants' calendars change too
+    scopes.extend(calendar_scope(uid) for uid in leave_meetups(user_id))
 
     # Delete the user entity
     user_key = client.key('User', user_id)
     client.delete(user_key)
+    versions.bump(*scopes)
 
     return jsonify({'success': True, 'data': {}})
 
 
+def _set_calendar_token(user_id, only_if_missing=False):
+    """Give the user a new calendar token in a transaction and return the User.
+
+    With `only_if_missing`, a token written by a concurrent request is kept,
+    so simultaneous first calls hand out the same feed URL.
+    """
+    client = get_client()
+    key = client.key('User', user_id)
+
+    def apply():
+        user = client.get(key)
+        if not user or (only_if_missing and user.get('calendarToken')):
+            return user
+        user['calendarToken'] = secrets.token_urlsafe(24)
+        client.put(user)
+        return user
+
+    return run_in_transaction(apply)
+
+
+def _calendar_response(user):
+    return jsonify({
+        'success': True,
+        'data': {'url': f'/api/calendar/{user["calendarToken"]}.ics'}
+    })
+
+
+@auth_bp.route('/calendar', methods=['GET'])
+@require_auth
+def get_calendar_feed():
+    """Get the URL of the user's calendar feed, creating its token on first use."""
+    user = get_user_by_id(request.user_id)
+    if user and not user.get('calendarToken'):
+        user = _set_calendar_token(request.user_id, only_if_missing=True)
+    if not user:
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'USER_NOT_FOUND',
+                'message': 'User not found'
+            }
+        }), 404
+    return _calendar_response(user)
+
+
+@auth_bp.route('/calendar/rotate', methods=['POST'])
+@require_auth
+def rotate_calendar_feed():
+    """Replace the calendar token; the old feed URL stops working."""
+    user = _set_calendar_token(request.user_id)
+    if not user:
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'USER_NOT_FOUND',
+                'message': 'User not found'
+            }
+        }), 404
+
+    versions.bump(calendar_scope(request.user_id))
+    return _calendar_response(user)
+
+
+@auth_bp.route('/users/<user_id>/picture', methods=['GET'])
+@require_auth
+def get_profile_picture(user_id):
+    """Get one user's profile picture, kept out of list payloads."""
+    user = get_user_by_id(user_id)
+
+    if not user or not user.get('profilePicture'):
+        return jsonify({
+            'success': False,
+            'error': {
+                'code': 'PICTURE_NOT_FOUND',
+                'message': 'No profile picture'
+            }
+        }), 404
+
+    etag = versions.compute_etag(user_id, user.get('updatedAt'), user.get('createdAt'))
+    cached = versions.not_modified(etag)
+    if cached:
+        return cached
+
+    return versions.with_etag(jsonify({
+        'success': True,
+        'data': {'userId': user_id, 'profilePicture': user.get('profilePicture')}
+    }), etag)
+
+
 @auth_bp.route('/profile-picture', methods=['POST'])
 @require_auth
 def upload_profile_picture():
@@ -0,0 +1,122 @@
+"""Weekly availability as a 168-bit mask.
+
+Bit `day * 24 + hour` is set when the user is free at that hour, with
+Monday as day 0. The mask is compiled once from the profile's availability
+map and cached on the User as `availabilityMask` (hex). Comparing two
+users is then a single AND, and expanding to calendar dates only reads the
+mask 24 bits at a time. Groups are counted hour-by-hour with bit-sliced
+addition across all participants' masks.
+"""
+from datetime import timedelta
+
+from models import expand_availability, WEEKDAYS
+
+HOURS_PER_DAY = 24
+HOURS_PER_WEEK = HOURS_PER_DAY * len(WEEKDAYS)
+_DAY_BITS = (1 << HOURS_PER_DAY) - 1
+
+
+def compile_mask(availability):
+    """Mask for an availability map like {"Monday": ["Morning", "14:00"]}."""
+    mask = 0
+    for day, hours in expand_availability(availability).items():
+        if day not in WEEKDAYS:
+            continue
+        offset = WEEKDAYS.index(day) * HOURS_PER_DAY
+        for hour in hours:
+            mask |= 1 << (offset + hour)
+    return mask
+
+
+def to_hex(mask):
+    return format(mask, f'0{HOURS_PER_WEEK // 4}x')
+
+
+def from_hex(value):
+    return int(value, 16) if value else 0
+
+
+def user_mask(user):
+    """A user's mask, from the cached hex when present."""
+    cached = user.get('availabilityMask')
+    if cached is not None:
+        return from_hex(cached)
+    return compile_mask(user.get('availability') or {})
+
+
+def day_hours(mask, weekday):
+    """Free hours (0-23) on a weekday index, in order."""
+    bits = (mask >> (weekday * HOURS_PER_DAY)) & _DAY_BITS
+    return [h for h in range(HOURS_PER_DAY) if bits >> h & 1]
+
+
+def weekly_hours(mask):
+    """{day name: [hours]} for every day with at least one free hour."""
+    weekly = {}
+    for index, day in enumerate(WEEKDAYS):
+        hours = day_hours(mask, index)
+        if hours:
+            weekly[day] = hours
+    return weekly
+
+
+def open_slots(mask, start_date, days, booked=()):
+    """Concrete free hours for `days` dates from start_date.
+
+    `booked` holds (ISO date, hour) pairs to leave out. Returns
+    [{'date', 'day', 'hours'}] for dates with any hour left.
+    """
+    booked = set(booked)
+    slots = []
+    for offset in range(days):
+        date = start_date + timedelta(days=offset)
+        iso = date.isoformat()
+        hours = [h for h in day_hours(mask, date.weekday()) if (iso, h) not in booked]
+        if hours:
+            slots.append({'date': iso, 'day': WEEKDAYS[date.weekday()], 'hours': hours})
+    return slots
+
+
+def count_planes(masks):
+    """Add up masks bitwise, all 168 hours at once.
+
+    Returns bit planes: plane k holds bit k of every hour's count. Each mask
+    ripples through the planes like a binary adder, so N masks cost about
+    N * log2(N) big-int operations instead of N * 168 bit tests.
+    """
+    planes = []
+    for mask in masks:
+        carry = mask
+        for k, plane in enumerate(planes):
+            if not carry:
+                break
+            planes[k], carry = plane ^ carry, plane & carry
+        if carry:
+            planes.append(carry)
+    return planes
+
+
+def hour_counts(planes):
+    """Per-hour counts (length 168) from count_planes() output."""
+    counts = [0] * HOURS_PER_WEEK
+    for k, plane in enumerate(planes):
+        weight = 1 << k
+        while plane:
+            low = plane & -plane
+            counts[low.bit_length() - 1] += weight
+            plane ^= low
+    return counts
+
+
+def best_slots(masks, k):
+    """The k weekly hours where the most masks are free.
+
+    Ties go to the earlier hour in the week. Returns
+    [{'day', 'hour', 'count'}]; hours nobody is free are never returned.
+    """
+    counts = hour_counts(count_planes(masks))
+    ranked = sorted((i for i in range(HOURS_PER_WEEK) if counts[i]), key=lambda i: (-counts[i], i))
+    return [
+        {'day': WEEKDAYS[i // HOURS_PER_DAY], 'hour': i % HOURS_PER_DAY, 'count': counts[i]}
+        for i in ranked[:k]
+    ]
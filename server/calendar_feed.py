@@ -0,0 +1,179 @@
+"""Per-user iCalendar feed of accepted sessions and joined meetups.
+
+Calendar apps poll /api/calendar/<token>.ics without an Authorization header,
+so the feed is addressed by the user's secret `calendarToken`. Writers bump
+the `calendar:{userId}` version scope whenever a session or meetup in the feed
+changes; an unchanged feed is answered 304 from that one Version read. A
+changed feed is streamed event by event straight from the queries.
+"""
+from datetime import datetime, timedelta
+
+import pytz
+from flask import Blueprint, Response, request, stream_with_context
+
+from db import get_client
+from config import Config
+import versions
+
+calendar_bp = Blueprint('calendar', __name__)
+
+# How far back past events stay in the feed
+HISTORY_DAYS = 30
+MEETUP_DURATION_HOURS = 2
+PRODID = '-//PokeMe//Calendar Feed//EN'
+
+
+def calendar_scope(user_id):
+    """Version scope covering everything in a user's calendar feed."""
+    return f'calendar:{user_id}'
+
+
+def get_user_by_calendar_token(token):
+    client = get_client()
+    query = client.query(kind='User')
+    query.add_filter('calendarToken', '=', token)
+    results = list(query.fetch(limit=1))
+    return results[0] if results else None
+
+
+def escape_text(value):
+    """Escape a TEXT property value (RFC 5545 3.3.11)."""
+    return (str(value or '')
+            .replace('\\', '\\\\')
+            .replace(';', '\\;')
+            .replace(',', '\\,')
+            .replace('\r\n', '\\n')
+            .replace('\n', '\\n'))
+
+
+def fold_line(line):
+    """Fold a content line at 75 octets, ending it with CRLF."""
+    encoded = line.encode('utf-8')
+    parts = []
+    limit = 75
+    while len(encoded) > limit:
+        cut = limit
+        # Don't split a multi-byte character
+        while cut > 0 and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut])
+        encoded = encoded[cut:]
+        limit = 74  # continuation lines start with a space
+    parts.append(encoded)
+    return b'\r\n '.join(parts).decode('utf-8') + '\r\n'
+
+
+def _utc_stamp(moment):
+    return moment.strftime('%Y%m%dT%H%M%SZ')
+
+
+def _parse_utc(iso):
+    return datetime.fromisoformat(iso.rstrip('Z')[:26])
+
+
+def session_event(session, dtstamp):
+    """VEVENT lines for an accepted Session, or [] if it has no start time."""
+    starts_at = session.get('startsAt')
+    if not starts_at:
+        return []
+    start = _parse_utc(starts_at)
+    start_hour = session.get('startHour') or 0
+    end_hour = session.get('endHour')
+    hours = end_hour - start_hour if end_hour and end_hour > start_hour else 1
+    session_id = session.key.name or str(session.key.id)
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:session-{session_id}@pokeme',
+        f'DTSTAMP:{dtstamp}',
+        f'DTSTART:{_utc_stamp(start)}',
+        f'DTEND:{_utc_stamp(start + timedelta(hours=hours))}',
+        f'SUMMARY:{escape_text(session.get("sport") or "PokeMe")} session',
+    ]
+    if session.get('location'):
+        lines.append(f'LOCATION:{escape_text(session.get("location"))}')
+    lines.append('END:VEVENT')
+    return lines
+
+
+def meetup_event(meetup, dtstamp):
+    """VEVENT lines for a Meetup, or [] if its date/time can't be read."""
+    try:
+        local = datetime.strptime(f'{meetup.get("date")} {meetup.get("time")}', '%Y-%m-%d %H:%M')
+    except (TypeError, ValueError):
+        return []
+    start = pytz.timezone(Config.TIMEZONE).localize(local).astimezone(pytz.utc)
+    meetup_id = meetup.key.name or str(meetup.key.id)
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:meetup-{meetup_id}@pokeme',
+        f'DTSTAMP:{dtstamp}',
+        f'DTSTART:{_utc_stamp(start)}',
+        f'DTEND:{_utc_stamp(start + timedelta(hours=MEETUP_DURATION_HOURS))}',
+        f'SUMMARY:{escape_text(meetup.get("title") or meetup.get("sport"))}',
+    ]
+    if meetup.get('location'):
+        lines.append(f'LOCATION:{escape_text(meetup.get("location"))}')
+    if meetup.get('description'):
+        lines.append(f'DESCRIPTION:{escape_text(meetup.get("description"))}')
+    if meetup.get('lat') is not None and meetup.get('lng') is not None:
+        lines.append(f'GEO:{meetup.get("lat")};{meetup.get("lng")}')
+    lines.append('END:VEVENT')
+    return lines
+
+
+def feed_lines(user_id, now=None):
+    """Yield the feed one folded line at a time, querying lazily."""
+    now = now or datetime.utcnow()
+    dtstamp = _utc_stamp(now)
+    since = now - timedelta(days=HISTORY_DAYS)
+    client = get_client()
+
+    for line in ('BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}',
+                 'CALSCALE:GREGORIAN', 'X-WR-CALNAME:PokeMe'):
+        yield fold_line(line)
+
+    sessions = client.query(kind='Session')
+    sessions.add_filter('userIds', '=', user_id)
+    sessions.add_filter('status', '=', 'accepted')
+    sessions.add_filter('startsAt', '>=', since.isoformat() + 'Z')
+    sessions.order = ['startsAt']
+    for session in sessions.fetch():
+        for line in session_event(session, dtstamp):
+            yield fold_line(line)
+
+    meetups = client.query(kind='Meetup')
+    meetups.add_filter('participants', '=', user_id)
+    meetups.add_filter('status', 'IN', ['active', 'expired'])
+    meetups.add_filter('date', '>=', since.date().isoformat())
+    meetups.order = ['date', 'time']
+    for meetup in meetups.fetch():
+        for line in meetup_event(meetup, dtstamp):
+            yield fold_line(line)
+
+    yield fold_line('END:VCALENDAR')
+
+
+@calendar_bp.route('/calendar/<token>.ics', methods=['GET'])
+def calendar_feed(token):
+    """Stream the user's accepted sessions and meetups as iCalendar."""
+    user = get_user_by_calendar_token(token)
+    if not user:
+        return Response('Not found\n', status=404, mimetype='text/plain')
+    user_id = user.key.name or str(user.key.id)
+
+    stamp, updated_at = versions.get_version(calendar_scope(user_id))
+    etag = versions.compute_etag(user_id, stamp)
+    last_modified = _parse_utc(updated_at).replace(microsecond=0) if updated_at else None
+
+    cached = versions.not_modified(etag)
+    if cached:
+        return cached
+    if (last_modified and not request.if_none_match and request.if_modified_since
+            and last_modified <= request.if_modified_since.replace(tzinfo=None)):
+        return versions.with_etag(Response(status=304), etag)
+
+    response = Response(stream_with_context(feed_lines(user_id)), mimetype='text/calendar')
+    response.headers['Content-Disposition'] = 'inline; filename="pokeme.ics"'
+    if last_modified:
+        response.last_modified = last_modified
+    return versions.with_etag(response, etag)
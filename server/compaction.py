@@ -0,0 +1,194 @@
+"""Pack old chat messages into MessageBlock entities.
+
+A block holds up to BLOCK_MAX_MESSAGES messages from one calendar month of
+one match, serialized as unindexed JSON. Only months that ended more than
+COMPACT_AFTER_DAYS ago are compacted, so a month is packed exactly once and
+the Match's `compactedThrough` marks where live Message entities begin.
+
+Run from the server directory:  python compaction.py [--days N] [--match ID]
+"""
+import argparse
+import json
+import logging
+from datetime import datetime, timedelta
+
+from db import get_client, Entity, run_in_transaction
+
+logger = logging.getLogger(__name__)
+
+COMPACT_AFTER_DAYS = 30
+BLOCK_MAX_MESSAGES = 200
+
+# Message fields kept in a block; matchId is implied by the block itself
+PACKED_FIELDS = ('senderId', 'text', 'createdAt', 'type', 'metadata', 'reactions', 'readBy')
+
+
+def compaction_cutoff(now=None, days=COMPACT_AFTER_DAYS):
+    """First instant of the month containing (now - days), as an ISO string.
+
+    Everything strictly before it belongs to fully-cold months.
+    """
+    moment = (now or datetime.utcnow()) - timedelta(days=days)
+    return moment.strftime('%Y-%m-01T00:00:00Z')
+
+
+def pack_message(message_id, msg):
+    """Compact dict for one message, dropping empty fields."""
+    packed = {'id': message_id}
+    for field in PACKED_FIELDS:
+        value = msg.get(field)
+        if value:
+            packed[field] = value
+    return packed
+
+
+def unpack_block(block):
+    """Messages stored in a block, oldest first."""
+    try:
+        return json.loads(block.get('payload') or '[]')
+    except (ValueError, TypeError):
+        logger.warning(f'Unreadable MessageBlock {block.key.name}')
+        return []
+
+
+def _block_entity(client, match_id, bucket, index, items):
+    key = client.key('MessageBlock', f'{match_id}_{bucket}_{index}')
+    block = Entity(key, exclude_from_indexes=['payload'])
+    block.update({
+        'matchId': match_id,
+        'bucket': bucket,
+        'startAt': items[0]['createdAt'],
+        'endAt': items[-1]['createdAt'],
+        'count': len(items),
+        'messageIds': [item['id'] for item in items],
+        'payload': json.dumps(items, separators=(',', ':'), ensure_ascii=False),
+    })
+    return block
+
+
+def compact_match(match_id, cutoff):
+    """Move a match's messages older than `cutoff` into blocks.
+
+    The Match's `compactedThrough` is advanced before the first block is
+    written, so readers look at blocks as soon as any exist. Each block is
+    packed from its messages re-read inside the transaction that deletes
+    them, so a crash mid-run never loses or duplicates a message and a
+    reaction added meanwhile conflicts instead of being dropped. Returns the
+    number of messages compacted.
+    """
+    client = get_client()
+
+    query = client.query(kind='Message')
+    query.add_filter('matchId', '=', match_id)
+    query.add_filter('createdAt', '<', cutoff)
+    query.order = ['createdAt']
+
+    by_bucket = {}
+    for msg in query.fetch():
+        by_bucket.setdefault((msg.get('createdAt') or '')[:7], []).append(msg.key)
+    if not by_bucket:
+        return 0
+
+    match_key = client.key('Match', match_id)
+
+    def mark():
+        match = client.get(match_key)
+        if match and (match.get('compactedThrough') or '') < cutoff:
+            match['compactedThrough'] = cutoff
+            client.put(match)
+
+    run_in_transaction(mark)
+
+    compacted = 0
+    for bucket, keys in sorted(by_bucket.items()):
+        # Continue numbering after blocks left by an interrupted earlier run
+        existing = client.query(kind='MessageBlock')
+        existing.add_filter('matchId', '=', match_id)
+        existing.add_filter('bucket', '=', bucket)
+        existing.keys_only()
+        next_index = len(list(existing.fetch()))
+
+        for start in range(0, len(keys), BLOCK_MAX_MESSAGES):
+            chunk = keys[start:start + BLOCK_MAX_MESSAGES]
+
+            def write(chunk=chunk, bucket=bucket, index=next_index):
+                messages = [m for m in client.get_multi(chunk) if m and m.get('matchId') == match_id]
+                if not messages:
+                    return 0
+                messages.sort(key=lambda m: m.get('createdAt') or '')
+                items = [pack_message(m.key.name or str(m.key.id), m) for m in messages]
+                client.put(_block_entity(client, match_id, bucket, index, items))
+                client.delete_multi([m.key for m in messages])
+                return len(messages)
+
+            written = run_in_transaction(write)
+            if written:
+                next_index += 1
+                compacted += written
+
+    return compacted
+
+
+def find_compacted_block(match_id, message_id):
+    """Key of the block holding a compacted message, or None."""
+    client = get_client()
+    query = client.query(kind='MessageBlock')
+    query.add_filter('messageIds', '=', message_id)
+    query.keys_only()
+    for block in query.fetch(limit=1):
+        if block.key.name and block.key.name.startswith(f'{match_id}_'):
+            return block.key
+    return None
+
+
+def update_compacted_message(block_key, message_id, mutate):
+    """Apply mutate(packed_message) to one message inside a block, transactionally.
+
+    Returns mutate's result, or None if the message is not in the block.
+    """
+    client = get_client()
+
+    def apply():
+        block = client.get(block_key)
+        if not block:
+            return None
+        items = unpack_block(block)
+        for item in items:
+            if item.get('id') == message_id:
+                result = mutate(item)
+                block['payload'] = json.dumps(items, separators=(',', ':'), ensure_ascii=False)
+                client.put(block)
+                return result
+        return None
+
+    return run_in_transaction(apply)
+
+
+def compact_all(days=COMPACT_AFTER_DAYS):
+    """Compact every match. Returns (matches_seen, messages_compacted)."""
+    client = get_client()
+    cutoff = compaction_cutoff(days=days)
+    query = client.query(kind='Match')
+    query.keys_only()
+
+    matches_seen = 0
+    messages_compacted = 0
+    for match in query.fetch():
+        matches_seen += 1
+        messages_compacted += compact_match(match.key.name or str(match.key.id), cutoff)
+    return matches_seen, messages_compacted
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Compact old chat messages into MessageBlocks')
+    parser.add_argument('--days', type=int, default=COMPACT_AFTER_DAYS)
+    parser.add_argument('--match', help='Only compact this match ID')
+    args = parser.parse_args()
+
+    if args.match:
+        count = compact_match(args.match, compaction_cutoff(days=args.days))
+        logger.info(f'Compacted {count} messages for match {args.match}')
+    else:
+        seen, count = compact_all(days=args.days)
+        logger.info(f'Compacted {count} messages across {seen} matches')
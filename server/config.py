@@ -9,3 +9,7 @@ class Config:
     INITIAL_SOCIAL_POINTS = 100
     TIMEZONE = 'America/Los_Angeles'  # Pacific Time for UC Davis
     ANTHROPIC_API_KEY = os.environ.get('ANTHROPIC_API_KEY')
+    # Optional Redis-compatible URL for typing indicators etc.; in-process memory when unset
+    EPHEMERAL_STORE_URL = os.environ.get('EPHEMERAL_STORE_URL')
+    # Run maintenance.py sweeps in-process every N minutes; 0 disables
+    MAINTENANCE_INTERVAL_MINUTES = int(os.environ.get('MAINTENANCE_INTERVAL_MINUTES', '0'))
@@ -0,0 +1,90 @@
+import random
+
+from db import get_client, Entity, run_in_transaction
+
+# Each counter is split across shards so concurrent increments rarely touch
+# the same entity; reads sum the shards with a single batched lookup.
+DEFAULT_SHARDS = 4
+MAX_KEYS_PER_LOOKUP = 1000
+
+
+# The poke badge is polled often; one shard keeps the read to a single entity
+POKE_COUNTER_SHARDS = 1
+
+
+def incoming_poke_counter(user_id):
+    """Counter name for the user's pending incoming pokes."""
+    return f'incoming_pokes:{user_id}'
+
+
+def unread_counter(match_id, user_id):
+    """Name of the sharded counter holding user_id's unread count for a match."""
+    return f'unread:{match_id}:{user_id}'
+
+
+def _shard_keys(client, name, shards):
+    return [client.key('CounterShard', f'{name}#{i}') for i in range(shards)]
+
+
+def increment(name, amount=1, shards=DEFAULT_SHARDS):
+    """Add `amount` to a counter by updating one randomly chosen shard."""
+    client = get_client()
+    key = client.key('CounterShard', f'{name}#{random.randrange(shards)}')
+
+    def apply():
+        shard = client.get(key)
+        if shard is None:
+            shard = Entity(key)
+            shard.update({'name': name, 'count': 0})
+        shard['count'] = shard.get('count', 0) + amount
+        client.put(shard)
+
+    run_in_transaction(apply)
+
+
+def get_counts(names, shards=DEFAULT_SHARDS):
+    """Return {name: total} for many counters; missing counters read as 0."""
+    client = get_client()
+    totals = {name: 0 for name in names}
+    keys = [k for name in totals for k in _shard_keys(client, name, shards)]
+    for i in range(0, len(keys), MAX_KEYS_PER_LOOKUP):
+        for shard in client.get_multi(keys[i:i + MAX_KEYS_PER_LOOKUP]):
+            if shard and shard.get('name') in totals:
+                totals[shard['name']] += shard.get('count', 0)
+    return {name: max(0, total) for name, total in totals.items()}
+
+
+def get_count(name, shards=DEFAULT_SHARDS):
+    return get_counts([name], shards)[name]
+
+
+def reset(name, shards=DEFAULT_SHARDS):
+    """Zero a counter by deleting all of its shards.
+
+    The shards are read before they are deleted, so an increment racing the
+    reset conflicts with it and is retried instead of being lost or reviving
+    the counter. Called inside a transaction, the reset joins it (e.g. to
+    move a read watermark atomically); otherwise it runs in its own.
+    """
+    client = get_client()
+    keys = _shard_keys(client, name, shards)
+
+    def apply():
+        client.get_multi(keys)
+        client.delete_multi(keys)
+
+    if getattr(client, 'current_transaction', None) is not None:
+        apply()
+    else:
+        run_in_transaction(apply)
+
+
+def set_count(name, value, shards=DEFAULT_SHARDS):
+    """Overwrite a counter with an exact total, e.g. after recounting."""
+    client = get_client()
+    keys = _shard_keys(client, name, shards)
+    shard = Entity(keys[0])
+    shard.update({'name': name, 'count': value})
+    client.put(shard)
+    if len(keys) > 1:
+        client.delete_multi(keys[1:])
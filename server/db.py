@@ -1,5 +1,8 @@
 from google.cloud import datastore
+from google.api_core.exceptions import Aborted, BadRequest, Conflict
 import os
+import random
+import time
 
 # Initialize Datastore client
 # When running on App Engine, credentials are automatic
@@ -13,3 +16,45 @@ def get_client():
 def Entity(key, exclude_from_indexes=None):
     """Create a Datastore entity."""
     return datastore.Entity(key=key, exclude_from_indexes=exclude_from_indexes or [])
+
+
+def exclude_from_indexes(entity, *names):
+    """Mark properties as unindexed (needed for large or nested values)."""
+    efi = set(entity.exclude_from_indexes)
+    efi.update(names)
+    entity.exclude_from_indexes = efi
+
+
+def run_in_transaction(fn, max_attempts=5, base_delay=0.05):
+    """Run fn() inside a transaction and return its result.
+
+    Reads and writes made through the client inside fn join the transaction.
+    On contention the whole function is retried with jittered exponential
+    backoff, so fn must not have side effects outside Datastore.
+    """
+    for attempt in range(max_attempts):
+        try:
+            with client.transaction():
+                return fn()
+        except (Aborted, Conflict):
+            if attempt == max_attempts - 1:
+                raise
+            time.sleep(base_delay * (2 ** attempt) * (0.5 + random.random()))
+
+
+def fetch_page(query, limit, cursor=None):
+    """Fetch one page of a query.
+
+    Returns (entities, next_cursor); next_cursor is a URL-safe string to pass
+    back for the following page, or None once the results are exhausted.
+    Raises ValueError for a cursor Datastore rejects.
+    """
+    try:
+        iterator = query.fetch(limit=limit, start_cursor=cursor or None)
+        entities = list(next(iterator.pages))
+    except BadRequest as e:
+        raise ValueError(f'Invalid cursor: {e}')
+    next_cursor = iterator.next_page_token
+    if isinstance(next_cursor, bytes):
+        next_cursor = next_cursor.decode('utf-8')
+    return entities, next_cursor or None
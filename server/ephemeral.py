@@ -0,0 +1,114 @@
+import json
+import logging
+import threading
+import time
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStore:
+    """In-process key/value map where every entry expires after a TTL."""
+
+    # Expired entries are purged lazily, at most once per this many seconds
+    SWEEP_INTERVAL_SECONDS = 60
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data = {}
+        self._next_sweep = clock() + self.SWEEP_INTERVAL_SECONDS
+
+    def set(self, key, value, ttl):
+        now = self._clock()
+        with self._lock:
+            self._data[key] = (value, now + ttl)
+            if now >= self._next_sweep:
+                self._sweep(now)
+
+    def get(self, key, default=None):
+        now = self._clock()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= now:
+                del self._data[key]
+                return default
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def delete_where(self, predicate):
+        """Drop every entry whose key satisfies predicate(key)."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def _sweep(self, now):
+        expired = [k for k, (_, expires_at) in self._data.items() if expires_at <= now]
+        for k in expired:
+            del self._data[k]
+        self._next_sweep = now + self.SWEEP_INTERVAL_SECONDS
+
+
+class RedisStore:
+    """set/get/delete like MemoryStore, backed by a Redis-compatible server so
+    every instance sees the same state. Values must be JSON-serializable.
+
+    Everything kept here is optional (typing indicators), so a server error
+    is logged and treated as a missing key rather than failing the request.
+    """
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                'EPHEMERAL_STORE_URL is set but the redis package is not installed '
+                '(pip install -r requirements.txt)'
+            ) from e
+        self._redis = redis.Redis.from_url(url)
+        self._errors = redis.exceptions.RedisError
+
+    def set(self, key, value, ttl):
+        try:
+            self._redis.set(key, json.dumps(value), px=max(1, int(ttl * 1000)))
+        except self._errors as e:
+            logger.warning(f'Ephemeral store unavailable, dropping set of {key}: {e}')
+
+    def get(self, key, default=None):
+        try:
+            raw = self._redis.get(key)
+        except self._errors as e:
+            logger.warning(f'Ephemeral store unavailable, treating {key} as unset: {e}')
+            return default
+        return json.loads(raw) if raw is not None else default
+
+    def delete(self, key):
+        try:
+            self._redis.delete(key)
+        except self._errors as e:
+            logger.warning(f'Ephemeral store unavailable, dropping delete of {key}: {e}')
+
+
+_store = None
+
+
+def get_store():
+    """Return the process-wide ephemeral store, creating it on first use."""
+    global _store
+    if _store is None:
+        if Config.EPHEMERAL_STORE_URL:
+            _store = RedisStore(Config.EPHEMERAL_STORE_URL)
+        else:
+            _store = MemoryStore()
+    return _store
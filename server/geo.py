@@ -0,0 +1,102 @@
+"""Geohash cells for "near me" queries.
+
+A meetup with coordinates stores the geohash of its position at each of
+CELL_PRECISIONS in an indexed list property. A radius query picks the finest
+precision whose cells are at least as large as the radius. The 3x3 block of
+cells around the centre then covers the whole circle, so an equality/IN
+filter on those nine cells finds every candidate. Exact distances are checked
+afterwards.
+"""
+import math
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Roughly 39x19 km, 4.9x4.9 km and 1.2x0.6 km cells
+CELL_PRECISIONS = (4, 5, 6)
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def encode(lat, lng, precision):
+    """Geohash of a point, `precision` characters long."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def cell_size_degrees(precision):
+    """(height, width) of a cell in degrees of latitude and longitude."""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def cells_for(lat, lng):
+    """Indexed cell list stored on an entity at (lat, lng)."""
+    return [encode(lat, lng, p) for p in CELL_PRECISIONS]
+
+
+def max_radius_km(lat):
+    """Largest radius covering_cells() can answer at this latitude."""
+    return _cell_span_km(CELL_PRECISIONS[0], lat)
+
+
+def _cell_span_km(precision, lat):
+    height, width = cell_size_degrees(precision)
+    return min(height * KM_PER_DEGREE, width * KM_PER_DEGREE * math.cos(math.radians(lat)))
+
+
+def covering_cells(lat, lng, radius_km):
+    """Cells whose union contains every point within radius_km of (lat, lng).
+
+    Returns the centre cell and its eight neighbours at the finest precision
+    whose cells span at least radius_km. Raises ValueError when the radius is
+    larger than the coarsest cell.
+    """
+    precision = next(
+        (p for p in reversed(CELL_PRECISIONS) if _cell_span_km(p, lat) >= radius_km),
+        None,
+    )
+    if precision is None:
+        raise ValueError(f'radius must be at most {max_radius_km(lat):.1f} km')
+
+    height, width = cell_size_degrees(precision)
+    cells = []
+    for dlat in (-height, 0, height):
+        for dlng in (-width, 0, width):
+            nlat = max(-90.0, min(90.0, lat + dlat))
+            nlng = (lng + dlng + 180.0) % 360.0 - 180.0
+            cell = encode(nlat, nlng, precision)
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Great-circle (haversine) distance between two points."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
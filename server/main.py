@@ -10,12 +10,19 @@ from auth import auth_bp
 from match import match_bp
 from phone_auth import phone_auth_bp
 from meetup import meetup_bp
+from calendar_feed import calendar_bp
 
 # Register blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(match_bp, url_prefix='/api')
 app.register_blueprint(phone_auth_bp, url_prefix='/api/phone')
 app.register_blueprint(meetup_bp, url_prefix='/api')
+app.register_blueprint(calendar_bp, url_prefix='/api')
+
+from config import Config
+if Config.MAINTENANCE_INTERVAL_MINUTES:
+    import maintenance
+    maintenance.start_scheduler(Config.MAINTENANCE_INTERVAL_MINUTES)
 
 
 @app.route('/api/health')
@@ -0,0 +1,205 @@
+"""Periodic cleanup of data that has reached the end of its life.
+
+Each sweep queries one kind for dead items, a batch at a time, and either
+moves them to a terminal state or deletes them, until the query comes back
+empty. Sweeps are idempotent, so overlapping runs (several instances, or the
+CLI alongside the scheduler) only repeat work.
+
+Run from the server directory:
+    python maintenance.py [sweep ...] [--compact]
+or set MAINTENANCE_INTERVAL_MINUTES to run every sweep from a background
+thread inside the app.
+"""
+import argparse
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from db import get_client
+from meetup import admit_join_requests
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 500
+SUPERSEDED_SESSION_RETENTION_DAYS = 7
+
+
+def _now_iso():
+    return datetime.utcnow().isoformat() + 'Z'
+
+
+def _drain(make_query, apply, batch_size=None):
+    """Fetch and apply batches until make_query() matches nothing.
+
+    apply(entities) must take every entity out of the query's result set,
+    otherwise the loop would never finish. Returns the number processed.
+    """
+    batch_size = batch_size or SWEEP_BATCH_SIZE
+    processed = 0
+    while True:
+        batch = list(make_query().fetch(limit=batch_size))
+        if not batch:
+            return processed
+        apply(batch)
+        processed += len(batch)
+
+
+def _delete_all(make_query):
+    client = get_client()
+
+    def keys_query():
+        query = make_query()
+        query.keys_only()
+        return query
+
+    return _drain(keys_query, lambda batch: client.delete_multi([e.key for e in batch]))
+
+
+def expire_meetups():
+    """Move active meetups dated before today to 'expired'."""
+    client = get_client()
+    today = datetime.utcnow().date().isoformat()
+
+    def query():
+        q = client.query(kind='Meetup')
+        q.add_filter('status', '=', 'active')
+        q.add_filter('date', '<', today)
+        q.order = ['date']
+        return q
+
+    def apply(meetups):
+        now = _now_iso()
+        for meetup in meetups:
+            meetup['status'] = 'expired'
+            meetup['updatedAt'] = now
+        client.put_multi(meetups)
+
+    # The feed only lists meetups from today on, so there is no cache to retire
+    return _drain(query, apply)
+
+
+def delete_expired_verification_codes():
+    """Delete phone verification codes past their expiresAt."""
+    client = get_client()
+    now = _now_iso()
+
+    def query():
+        q = client.query(kind='VerificationCode')
+        q.add_filter('expiresAt', '<', now)
+        return q
+
+    return _delete_all(query)
+
+
+def delete_typing_indicators():
+    """Delete TypingIndicator rows left over from before typing moved to ephemeral.py."""
+    client = get_client()
+    return _delete_all(lambda: client.query(kind='TypingIndicator'))
+
+
+def delete_superseded_sessions(days=SUPERSEDED_SESSION_RETENTION_DAYS):
+    """Delete sessions superseded by a newer proposal more than `days` ago."""
+    client = get_client()
+    cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat() + 'Z'
+
+    def query():
+        q = client.query(kind='Session')
+        q.add_filter('status', '=', 'superseded')
+        q.add_filter('updatedAt', '<', cutoff)
+        return q
+
+    return _delete_all(query)
+
+
+def admit_queued_joins():
+    """Admit join requests still pending, e.g. after the instance that queued them
+    stopped. Returns the number admitted."""
+    client = get_client()
+
+    def query():
+        q = client.query(kind='MeetupJoinRequest')
+        q.add_filter('status', '=', 'pending')
+        return q
+
+    admitted = 0
+
+    def apply(requests):
+        nonlocal admitted
+        # Each run admits or rejects every pending request of its meetup
+        for meetup_id in dict.fromkeys(r.get('meetupId') for r in requests):
+            admitted += admit_join_requests(meetup_id)
+
+    _drain(query, apply)
+    return admitted
+
+
+def compact_messages():
+    """Pack cold chat history into MessageBlocks (see compaction.py)."""
+    import compaction
+    _, compacted = compaction.compact_all()
+    return compacted
+
+
+SWEEPS = {
+    'meetups': expire_meetups,
+    'verification_codes': delete_expired_verification_codes,
+    'typing_indicators': delete_typing_indicators,
+    'superseded_sessions': delete_superseded_sessions,
+    'join_requests': admit_queued_joins,
+}
+
+
+def run_sweeps(names=None, compact=False):
+    """Run the named sweeps (default: all). Returns {name: {'count', 'seconds'}}."""
+    selected = list(names or SWEEPS)
+    if compact:
+        selected.append('compaction')
+
+    metrics = {}
+    for name in selected:
+        fn = compact_messages if name == 'compaction' else SWEEPS[name]
+        started = time.monotonic()
+        try:
+            count = fn()
+        except Exception as e:
+            logger.warning(f'Sweep {name} failed: {type(e).__name__}: {e}')
+            metrics[name] = {'count': None, 'error': str(e)}
+            continue
+        seconds = round(time.monotonic() - started, 2)
+        metrics[name] = {'count': count, 'seconds': seconds}
+        logger.info(f'Sweep {name}: {count} items in {seconds}s')
+    return metrics
+
+
+_scheduler = None
+
+
+def start_scheduler(interval_minutes, compact=False):
+    """Run every sweep on a daemon thread every `interval_minutes`. Idempotent."""
+    global _scheduler
+    if _scheduler is not None:
+        return _scheduler
+
+    def loop():
+        while True:
+            time.sleep(interval_minutes * 60)
+            run_sweeps(compact=compact)
+
+    _scheduler = threading.Thread(target=loop, name='pokeme-maintenance', daemon=True)
+    _scheduler.start()
+    return _scheduler
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Retire expired and superseded data')
+    parser.add_argument('sweeps', nargs='*', help=f'one or more of: {", ".join(SWEEPS)} (default: all)')
+    parser.add_argument('--compact', action='store_true', help='Also run message compaction')
+    args = parser.parse_args()
+    for name in args.sweeps:
+        if name not in SWEEPS:
+            parser.error(f'unknown sweep: {name}')
+
+    for name, result in run_sweeps(args.sweeps, compact=args.compact).items():
+        print(f'{name:22} {result}')
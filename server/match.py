@@ -1,20 +1,39 @@
 from flask import Blueprint, request, jsonify
-from datetime import datetime
-import pytz
+from datetime import datetime, timedelta
 import uuid
 
-from db import get_client, Entity
+import pytz
+
+from db import get_client, Entity, exclude_from_indexes, run_in_transaction, fetch_page
 from config import Config
-from models import user_to_dict, expand_availability, session_to_dict
+from models import (
+    user_to_dict, session_to_dict, reactions_to_list, match_partner_id,
+    profile_snapshot, session_starts_at, utc_timestamp,
+)
 from middleware import require_auth
-from auth import get_user_by_id
+from auth import get_user_by_id, delete_match_data, dependent_scopes
 from recommendation import rank_discover_candidates
+from ephemeral import get_store
+from calendar_feed import calendar_scope
+from counters import incoming_poke_counter, POKE_COUNTER_SHARDS
+import availability
+import compaction
+import counters
+import versions
 
 match_bp = Blueprint('match', __name__)
 
 # Constants
 ALLOWED_REACTIONS = ['👍', '❤️', '😂', '😮', '😢']
 TYPING_EXPIRY_SECONDS = 10
+MESSAGE_PAGE_MAX = 200
+SESSION_PAGE_SIZE = 20
+OPEN_SLOT_DAYS = 14
+ACTIVE_SESSION_STATUSES = ['pending', 'accepted']
+OPEN_SLOT_DAYS_MAX = 28
+SESSION_PAGE_MAX = 100
+POKE_PAGE_SIZE = 20
+POKE_PAGE_MAX = 50
 
 
 def error_response(code, message, status=400):
@@ -24,6 +43,11 @@ def error_response(code, message, status=400):
     }), status
 
 
+def pair_match_id(user_a, user_b):
+    """Match ID for a pair of users; the same whichever of them pokes last."""
+    return '_'.join(sorted([user_a, user_b]))
+
+
 def get_match_for_user(match_id, user_id):
     """Get a match and verify the user is part of it. Returns (match, partner_id)."""
     client = get_client()
@@ -36,8 +60,221 @@ def get_match_for_user(match_id, user_id):
     if match.get('user1Id') != user_id and match.get('user2Id') != user_id:
         return None, None
 
-    partner_id = match.get('user2Id') if match.get('user1Id') == user_id else match.get('user1Id')
-    return match, partner_id
+    return match, match_partner_id(match, user_id)
+
+
+def _read_state_key(client, match_id, user_id):
+    return client.key('ReadState', f'{match_id}_{user_id}')
+
+
+def get_read_watermarks(match_id, user_ids):
+    """Return {userId: lastReadAt} for the given participants in one lookup."""
+    client = get_client()
+    states = client.get_multi([_read_state_key(client, match_id, uid) for uid in user_ids])
+    return {s.get('userId'): s.get('lastReadAt') for s in states if s}
+
+
+def derive_read_by(msg, watermarks):
+    """readBy for a message: its sender plus everyone whose watermark has reached it.
+
+    Messages written before watermarks existed may still carry a readBy list.
+    """
+    read_by = list(msg.get('readBy') or [msg.get('senderId')])
+    created_at = msg.get('createdAt') or ''
+    for uid, last_read in watermarks.items():
+        if uid not in read_by and last_read and created_at <= last_read:
+            read_by.append(uid)
+    return read_by
+
+
+def local_today():
+    """Today's date in Config.TIMEZONE."""
+    return datetime.now(pytz.timezone(Config.TIMEZONE)).date()
+
+
+def booked_hours(sessions):
+    """(local ISO date, hour) pairs covered by the given sessions."""
+    tz = pytz.timezone(Config.TIMEZONE)
+    booked = set()
+    for session in sessions:
+        starts_at = session.get('startsAt')
+        start_hour = session.get('startHour')
+        if not starts_at or start_hour is None:
+            continue
+        start = pytz.utc.localize(datetime.fromisoformat(starts_at.rstrip('Z'))).astimezone(tz)
+        end_hour = session.get('endHour')
+        if end_hour is None or end_hour <= start_hour:
+            end_hour = start_hour + 1
+        booked.update((start.date().isoformat(), h) for h in range(start_hour, end_hour))
+    return booked
+
+
+def pointed_session(client, pointer):
+    """The pending/accepted session an ActiveSession pointer refers to, as a list."""
+    session_id = pointer.get('sessionId')
+    session = client.get(client.key('Session', session_id)) if session_id else None
+    return [session] if session and session.get('status') in ACTIVE_SESSION_STATUSES else []
+
+
+def legacy_active_sessions(client, match_id):
+    """Pending/accepted sessions of a match that has no ActiveSession pointer yet.
+
+    An indexed (matchId, status) query, so it must run outside transactions.
+    """
+    query = client.query(kind='Session')
+    query.add_filter('matchId', '=', match_id)
+    query.add_filter('status', 'IN', ACTIVE_SESSION_STATUSES)
+    return sorted(query.fetch(), key=lambda s: s.get('createdAt', ''))
+
+
+def active_sessions(client, match_id):
+    """The match's pending or accepted sessions (at most one for new matches)."""
+    pointer = client.get(client.key('ActiveSession', match_id))
+    if pointer is None:
+        return legacy_active_sessions(client, match_id)
+    return pointed_session(client, pointer)
+
+
+def release_active_session(client, match_id, session_id, now):
+    """Clear the match's ActiveSession pointer if it refers to session_id.
+
+    Call inside the transaction that ends the session. Returns the pointer to
+    put, or None when it already points elsewhere.
+    """
+    pointer = client.get(client.key('ActiveSession', match_id))
+    if pointer is None or pointer.get('sessionId') != session_id:
+        return None
+    pointer['sessionId'] = None
+    pointer['updatedAt'] = now
+    return pointer
+
+
+def message_to_dict(message_id, match_id, msg, watermarks):
+    """Serialize a Message entity or a packed message from a MessageBlock."""
+    msg_dict = {
+        'id': message_id,
+        'matchId': match_id,
+        'senderId': msg.get('senderId'),
+        'text': msg.get('text'),
+        'createdAt': msg.get('createdAt'),
+        'readBy': derive_read_by(msg, watermarks),
+        'reactions': reactions_to_list(msg.get('reactions'))
+    }
+    if msg.get('type'):
+        msg_dict['type'] = msg.get('type')
+    if msg.get('metadata'):
+        msg_dict['metadata'] = msg.get('metadata')
+    return msg_dict
+
+
+def _add_reaction(target, user_id, emoji, now):
+    """Add a reaction to target['reactions'] ({emoji: {userId: createdAt}}).
+
+    Returns (createdAt, changed).
+    """
+    reactions = dict(target.get('reactions') or {})
+    users = dict(reactions.get(emoji) or {})
+    if user_id in users:
+        return users[user_id], False
+    users[user_id] = now
+    reactions[emoji] = users
+    target['reactions'] = reactions
+    return now, True
+
+
+def _remove_reaction(target, user_id, emoji):
+    """Remove a reaction from target['reactions']. Returns True if it was present."""
+    reactions = dict(target.get('reactions') or {})
+    users = dict(reactions.get(emoji) or {})
+    if user_id not in users:
+        return False
+    del users[user_id]
+    if users:
+        reactions[emoji] = users
+    else:
+        reactions.pop(emoji, None)
+    target['reactions'] = reactions
+    return True
+
+
+def _update_compacted_message(match, match_id, message_id, mutate):
+    """Apply mutate() to a message that compaction moved into a MessageBlock."""
+    if not match.get('compactedThrough'):
+        return None
+    block_key = compaction.find_compacted_block(match_id, message_id)
+    if block_key is None:
+        return None
+    return compaction.update_compacted_message(block_key, message_id, mutate)
+
+
+def record_last_message(match_id, text, sender_id, created_at):
+    """Advance the match's MatchActivity summary to this message.
+
+    The summary lives in its own small entity so chat traffic never rewrites
+    the Match, and the write only moves forward in time, so concurrent or
+    out-of-order writers cannot replace a newer message with an older one.
+    """
+    client = get_client()
+    key = client.key('MatchActivity', match_id)
+
+    def advance():
+        activity = client.get(key)
+        if activity and (activity.get('lastMessageCreatedAt') or '') >= created_at:
+            return False
+        activity = Entity(key, exclude_from_indexes=['lastMessageText'])
+        activity.update({
+            'matchId': match_id,
+            'lastMessageText': text,
+            'lastMessageSenderId': sender_id,
+            'lastMessageCreatedAt': created_at,
+        })
+        client.put(activity)
+        return True
+
+    return run_in_transaction(advance)
+
+
+def _last_message_summary(activity, match):
+    """lastMessage for a match list row.
+
+    Read from MatchActivity, or from the lastMessage* fields older Match
+    entities carry. Matches with neither are backfilled by the
+    match_last_activity migration, never on the read path.
+    """
+    source = activity if activity and activity.get('lastMessageCreatedAt') else match
+    if not source.get('lastMessageCreatedAt'):
+        return None
+    return {
+        'text': source.get('lastMessageText'),
+        'senderId': source.get('lastMessageSenderId'),
+        'createdAt': source.get('lastMessageCreatedAt')
+    }
+
+
+def bump_match_versions(match_id, *user_ids, calendar=False):
+    """Invalidate ETags for a match's thread and the given users' match lists
+    (and their calendar feeds, when a session changed)."""
+    scopes = [f'matches:{uid}' for uid in user_ids]
+    if calendar:
+        scopes.extend(calendar_scope(uid) for uid in user_ids)
+    versions.bump(f'messages:{match_id}', *scopes)
+
+
+def _typing_key(match_id, user_id):
+    return f'typing:{match_id}:{user_id}'
+
+
+def set_typing(match_id, user_id, is_typing):
+    """Record a typing toggle in the ephemeral store; it expires on its own."""
+    store = get_store()
+    if is_typing:
+        store.set(_typing_key(match_id, user_id), True, TYPING_EXPIRY_SECONDS)
+    else:
+        store.delete(_typing_key(match_id, user_id))
+
+
+def is_typing(match_id, user_id):
+    return bool(get_store().get(_typing_key(match_id, user_id)))
 
 
 # ──────────────────────────────────────────────
@@ -63,14 +300,10 @@ def discover():
     poked_ids = set(p.get('toUserId') for p in poke_query.fetch())
 
     # Get user IDs the current user is already matched with
-    matched_ids = set()
-    for field in ['user1Id', 'user2Id']:
-        q = client.query(kind='Match')
-        q.add_filter(field, '=', user_id)
-        q.add_filter('status', '=', 'active')
-        for m in q.fetch():
-            other = m.get('user2Id') if field == 'user1Id' else m.get('user1Id')
-            matched_ids.add(other)
+    q = client.query(kind='Match')
+    q.add_filter('userIds', '=', user_id)
+    q.add_filter('status', '=', 'active')
+    matched_ids = set(match_partner_id(m, user_id) for m in q.fetch())
 
     exclude_ids = poked_ids | matched_ids | {user_id}
 
@@ -121,94 +354,144 @@ def poke(target_user_id):
     if user_id == target_user_id:
         return error_response('POKE_FAILED', 'Cannot poke yourself')
 
-    target = get_user_by_id(target_user_id)
-    if not target:
-        return error_response('USER_NOT_FOUND', 'User not found', 404)
-
     client = get_client()
-
-    # Check if already poked
+    now = datetime.utcnow().isoformat() + 'Z'
+    target_key = client.key('User', target_user_id)
+    me_key = client.key('User', user_id)
     poke_key = client.key('Poke', f'{user_id}_{target_user_id}')
-    if client.get(poke_key):
-        return jsonify({
-            'success': True,
-            'data': {'status': 'already_poked', 'message': 'You already poked this user'}
-        })
-
-    # Create poke
-    poke_entity = Entity(poke_key)
-    poke_entity.update({
-        'fromUserId': user_id,
-        'toUserId': target_user_id,
-        'createdAt': datetime.utcnow().isoformat() + 'Z'
-    })
-    client.put(poke_entity)
-
-    # Check for mutual poke
     reverse_key = client.key('Poke', f'{target_user_id}_{user_id}')
-    if client.get(reverse_key):
-        # Mutual poke — create match
-        match_id = str(uuid.uuid4())
-        match_entity = Entity(client.key('Match', match_id))
+    match_id = pair_match_id(user_id, target_user_id)
+    match_key = client.key('Match', match_id)
+
+    def apply():
+        # One batched read for everything the decision depends on
+        found = {
+            (e.key.kind, e.key.name): e
+            for e in client.get_multi([target_key, me_key, poke_key, reverse_key, match_key])
+        }
+        target = found.get(('User', target_user_id))
+        if not target:
+            return 'not_found', None, None, False
+        if ('Poke', poke_key.name) in found:
+            return 'already_poked', target, None, False
+
+        reverse = found.get(('Poke', reverse_key.name))
+        poke_entity = Entity(poke_key)
+        poke_entity.update({
+            'fromUserId': user_id,
+            'toUserId': target_user_id,
+            'status': 'matched' if reverse else 'pending',
+            'createdAt': now
+        })
+        client.put(poke_entity)
+
+        if not reverse:
+            return 'poked', target, None, False
+
+        # The partner's poke leaves this user's incoming list
+        reverse_was_pending = reverse.get('status') == 'pending'
+        reverse['status'] = 'matched'
+        client.put(reverse)
+
+        # Mutual poke — the pair's match key is fixed, so a racing poke from
+        # the partner conflicts on it instead of creating a second match. A
+        # Match already stored under the key is left over from an earlier
+        # pairing and starts over: fresh profiles, active, no session.
+        match_entity = found.get(('Match', match_id))
+        if not match_entity:
+            match_entity = Entity(match_key, exclude_from_indexes=['profiles'])
+        me = found.get(('User', user_id))
         match_entity.update({
             'user1Id': user_id,
             'user2Id': target_user_id,
+            'userIds': [user_id, target_user_id],
+            'profiles': {
+                uid: profile_snapshot(u)
+                for uid, u in ((user_id, me), (target_user_id, target)) if u
+            },
             'status': 'active',
-            'createdAt': datetime.utcnow().isoformat() + 'Z'
+            'createdAt': now
         })
-        client.put(match_entity)
+        exclude_from_indexes(match_entity, 'profiles')
+        pointer = Entity(client.key('ActiveSession', match_id))
+        pointer.update({'matchId': match_id, 'sessionId': None, 'updatedAt': now})
+        client.put_multi([match_entity, pointer])
+        return 'matched', target, match_entity, reverse_was_pending
 
-        partner = user_to_dict(target)
+    status, target, match_entity, reverse_was_pending = run_in_transaction(apply)
+
+    if status == 'not_found':
+        return error_response('USER_NOT_FOUND', 'User not found', 404)
+    if status == 'already_poked':
         return jsonify({
             'success': True,
-            'data': {
-                'status': 'matched',
-                'message': "It's a match!",
-                'match': {
-                    'id': match_id,
-                    'partnerId': target_user_id,
-                    'partnerName': partner.get('displayName'),
-                    'partnerSports': partner.get('sports', []),
-                    'partnerCollegeYear': partner.get('collegeYear'),
-                    'partnerProfilePicture': partner.get('profilePicture'),
-                    'status': 'active',
-                    'createdAt': match_entity.get('createdAt')
-                }
-            }
+            'data': {'status': 'already_poked', 'message': 'You already poked this user'}
+        })
+
+    if status == 'poked':
+        counters.increment(incoming_poke_counter(target_user_id), shards=POKE_COUNTER_SHARDS)
+        versions.bump(f'pokes:{target_user_id}')
+        return jsonify({
+            'success': True,
+            'data': {'status': 'poked', 'message': 'Poke sent!'}
         })
 
+    if reverse_was_pending:
+        counters.increment(incoming_poke_counter(user_id), -1, shards=POKE_COUNTER_SHARDS)
+    versions.bump(f'matches:{user_id}', f'matches:{target_user_id}',
+                  f'pokes:{user_id}', f'pokes:{target_user_id}')
+
+    partner = user_to_dict(target)
     return jsonify({
         'success': True,
-        'data': {'status': 'poked', 'message': 'Poke sent!'}
+        'data': {
+            'status': 'matched',
+            'message': "It's a match!",
+            'match': {
+                'id': match_id,
+                'partnerId': target_user_id,
+                'partnerName': partner.get('displayName'),
+                'partnerSports': partner.get('sports', []),
+                'partnerCollegeYear': partner.get('collegeYear'),
+                'partnerProfilePicture': partner.get('profilePicture'),
+                'status': 'active',
+                'createdAt': match_entity.get('createdAt')
+            }
+        }
     })
 
 
 @match_bp.route('/pokes/incoming', methods=['GET'])
 @require_auth
 def get_incoming_pokes():
-    """Get all incoming pokes for the current user (excluding already-matched users)."""
+    """Get a page of pending incoming pokes for the current user, newest first."""
     user_id = request.user_id
     client = get_client()
 
-    # Get matched user IDs (same pattern as discover)
-    matched_ids = set()
-    for field in ['user1Id', 'user2Id']:
-        q = client.query(kind='Match')
-        q.add_filter('status', '=', 'active')
-        q.add_filter(field, '=', user_id)
-        for m in q.fetch():
-            other = m.get('user2Id') if field == 'user1Id' else m.get('user1Id')
-            matched_ids.add(other)
-
-    # Query pokes where toUserId = current user
+    etag = versions.compute_etag(user_id, request.full_path, *versions.get_stamps(f'pokes:{user_id}'))
+    cached = versions.not_modified(etag)
+    if cached:
+        return cached
+
+    cursor = request.args.get('cursor')
+    limit = max(1, min(request.args.get('limit', POKE_PAGE_SIZE, type=int), POKE_PAGE_MAX))
+
+    # Pokes from users this user has matched with are marked 'matched' when
+    # the match forms, so the filter excludes them without a Match query.
+    # Pokes from before `status` existed stay hidden until the poke_status
+    # migration has run, which is why it must run before deploying.
     poke_query = client.query(kind='Poke')
     poke_query.add_filter('toUserId', '=', user_id)
-    incoming_pokes = list(poke_query.fetch())
+    poke_query.add_filter('status', '=', 'pending')
+    poke_query.order = ['-createdAt']
+
+    try:
+        incoming_pokes, next_cursor = fetch_page(poke_query, limit, cursor)
+    except ValueError:
+        return error_response('VALIDATION_ERROR', 'Invalid cursor')
 
-    # Filter out pokes from matched users, then batch-fetch all sender profiles
-    filtered = [p for p in incoming_pokes if p.get('fromUserId') not in matched_ids]
-    from_ids = [p.get('fromUserId') for p in filtered]
-    sender_keys = [client.key('User', uid) for uid in from_ids]
+    # Batch-fetch the page's sender profiles
+    sender_keys = [client.key('User', p.get('fromUserId')) for p in incoming_pokes]
     sender_entities = client.get_multi(sender_keys) if sender_keys else []
     sender_map = {
         (u.key.name or str(u.key.id)): u
@@ -216,7 +499,7 @@ def get_incoming_pokes():
     }
 
     pokes = []
-    for p in filtered:
+    for p in incoming_pokes:
         from_id = p.get('fromUserId')
         from_user = sender_map.get(from_id)
         if not from_user:
@@ -228,11 +511,20 @@ def get_incoming_pokes():
             'fromUser': user_to_dict(from_user, include_picture=False)
         })
 
-    pokes.sort(key=lambda x: x.get('createdAt', ''), reverse=True)
+    return versions.with_etag(jsonify({
+        'success': True,
+        'data': {'pokes': pokes, 'count': len(pokes), 'nextCursor': next_cursor}
+    }), etag)
+
 
+@match_bp.route('/pokes/incoming/count', methods=['GET'])
+@require_auth
+def get_incoming_poke_count():
+    """Number of pending incoming pokes, for the badge. One entity read."""
+    count = counters.get_count(incoming_poke_counter(request.user_id), shards=POKE_COUNTER_SHARDS)
     return jsonify({
         'success': True,
-        'data': {'pokes': pokes, 'count': len(pokes)}
+        'data': {'count': count}
     })
 
 
@@ -254,14 +546,10 @@ def debug_discover():
     poked_ids = set(p.get('toUserId') for p in poke_query.fetch())
 
     # Get matched IDs
-    matched_ids = set()
-    for field in ['user1Id', 'user2Id']:
-        q = client.query(kind='Match')
-        q.add_filter(field, '=', user_id)
-        q.add_filter('status', '=', 'active')
-        for m in q.fetch():
-            other = m.get('user2Id') if field == 'user1Id' else m.get('user1Id')
-            matched_ids.add(other)
+    q = client.query(kind='Match')
+    q.add_filter('userIds', '=', user_id)
+    q.add_filter('status', '=', 'active')
+    matched_ids = set(match_partner_id(m, user_id) for m in q.fetch())
 
     exclude_ids = poked_ids | matched_ids | {user_id}
 
@@ -302,12 +590,19 @@ def reset_user_data():
     deleted_pokes = 0
     deleted_matches = 0
 
-    # Delete outgoing pokes
+    # Poke recipients and match partners (lists and calendars) see the
+    # change; collect them before the pokes and matches are deleted
+    scopes = dependent_scopes(user_id)
+
+    # Delete outgoing pokes, taking pending ones off the recipients' badges
     q = client.query(kind='Poke')
     q.add_filter('fromUserId', '=', user_id)
     for p in q.fetch():
         client.delete(p.key)
         deleted_pokes += 1
+        if p.get('status') == 'pending':
+            counters.increment(incoming_poke_counter(p.get('toUserId')), -1,
+                               shards=POKE_COUNTER_SHARDS)
 
     # Delete incoming pokes
     q = client.query(kind='Poke')
@@ -316,13 +611,15 @@ def reset_user_data():
         client.delete(p.key)
         deleted_pokes += 1
 
-    # Delete matches where user is user1 or user2
-    for field in ['user1Id', 'user2Id']:
-        q = client.query(kind='Match')
-        q.add_filter(field, '=', user_id)
-        for m in q.fetch():
-            client.delete(m.key)
-            deleted_matches += 1
+    # Delete matches the user is part of, with everything stored under them
+    q = client.query(kind='Match')
+    q.add_filter('userIds', '=', user_id)
+    for m in q.fetch():
+        delete_match_data(m)
+        deleted_matches += 1
+
+    counters.reset(incoming_poke_counter(user_id), shards=POKE_COUNTER_SHARDS)
+    versions.bump(f'pokes:{user_id}', f'matches:{user_id}', calendar_scope(user_id), *scopes)
 
     return jsonify({
         'success': True,
@@ -337,61 +634,58 @@ def get_matches():
     user_id = request.user_id
     client = get_client()
 
+    etag = versions.compute_etag(user_id, *versions.get_stamps(f'matches:{user_id}'))
+    cached = versions.not_modified(etag)
+    if cached:
+        return cached
+
+    q = client.query(kind='Match')
+    q.add_filter('userIds', '=', user_id)
+    q.add_filter('status', '=', 'active')
+    rows = [(m, match_partner_id(m, user_id)) for m in q.fetch()]
+
+    # Last-activity summaries for every match in one batched lookup
+    activity_keys = [client.key('MatchActivity', m.key.name or str(m.key.id)) for m, _ in rows]
+    activities = {
+        a.key.name: a for a in client.get_multi(activity_keys) if a
+    } if activity_keys else {}
+
+    # Partner profiles come from the snapshot stored on each Match; only
+    # matches created before snapshots existed need a User lookup.
+    missing = {pid for m, pid in rows if not (m.get('profiles') or {}).get(pid)}
+    fallback_profiles = {}
+    if missing:
+        for u in client.get_multi([client.key('User', pid) for pid in missing]):
+            if u:
+                fallback_profiles[u.key.name or str(u.key.id)] = profile_snapshot(u)
+
     matches = []
+    for m, partner_id in rows:
+        pd = (m.get('profiles') or {}).get(partner_id) or fallback_profiles.get(partner_id) or {}
+
+        match_id = m.key.name or str(m.key.id)
+        last_message = _last_message_summary(activities.get(match_id), m)
+
+        matches.append({
+            'id': match_id,
+            'partnerId': partner_id,
+            'partnerName': pd.get('displayName') or 'Unknown',
+            'partnerSports': pd.get('sports') or [],
+            'partnerCollegeYear': pd.get('collegeYear'),
+            'partnerProfilePicture': None,
+            'partnerBio': pd.get('bio'),
+            'partnerMajor': pd.get('major'),
+            'partnerAvailability': pd.get('availability'),
+            'partnerSocials': pd.get('socials'),
+            'status': m.get('status'),
+            'lastMessage': last_message,
+            'createdAt': m.get('createdAt')
+        })
 
-    for field in ['user1Id', 'user2Id']:
-        q = client.query(kind='Match')
-        q.add_filter(field, '=', user_id)
-        q.add_filter('status', '=', 'active')
-
-        for m in q.fetch():
-            partner_id = m.get('user2Id') if field == 'user1Id' else m.get('user1Id')
-            partner = get_user_by_id(partner_id)
-            pd = user_to_dict(partner, include_picture=False) if partner else {}
-
-            match_id = m.key.name or str(m.key.id)
-
-            # Fast path: read lastMessage cached on the Match entity
-            last_message = None
-            if m.get('lastMessageCreatedAt'):
-                last_message = {
-                    'text': m.get('lastMessageText'),
-                    'senderId': m.get('lastMessageSenderId'),
-                    'createdAt': m.get('lastMessageCreatedAt')
-                }
-            else:
-                # Slow path fallback for matches that predate this optimisation;
-                # backfills the cache so the slow path only runs once per match.
-                msg_query = client.query(kind='Message')
-                msg_query.add_filter('matchId', '=', match_id)
-                msgs = sorted(msg_query.fetch(), key=lambda x: x.get('createdAt', ''))
-                if msgs:
-                    last = msgs[-1]
-                    last_message = {
-                        'text': last.get('text'),
-                        'senderId': last.get('senderId'),
-                        'createdAt': last.get('createdAt')
-                    }
-                    m['lastMessageText'] = last_message['text']
-                    m['lastMessageSenderId'] = last_message['senderId']
-                    m['lastMessageCreatedAt'] = last_message['createdAt']
-                    client.put(m)
-
-            matches.append({
-                'id': match_id,
-                'partnerId': partner_id,
-                'partnerName': pd.get('displayName', 'Unknown'),
-                'partnerSports': pd.get('sports', []),
-                'partnerCollegeYear': pd.get('collegeYear'),
-                'partnerProfilePicture': pd.get('profilePicture'),
-                'partnerBio': pd.get('bio'),
-                'partnerMajor': pd.get('major'),
-                'partnerAvailability': pd.get('availability'),
-                'partnerSocials': pd.get('socials'),
-                'status': m.get('status'),
-                'lastMessage': last_message,
-                'createdAt': m.get('createdAt')
-            })
+    # Unread badges for every match in one batched counter lookup
+    unread = counters.get_counts([counters.unread_counter(m['id'], user_id) for m in matches])
+    for m in matches:
+        m['unreadCount'] = unread[counters.unread_counter(m['id'], user_id)]
 
     # Sort by most recent activity
     matches.sort(
@@ -399,10 +693,10 @@ def get_matches():
         reverse=True
     )
 
-    return jsonify({
+    return versions.with_etag(jsonify({
         'success': True,
         'data': {'matches': matches}
-    })
+    }), etag)
 
 
 # ──────────────────────────────────────────────
@@ -420,74 +714,82 @@ def get_messages(match_id):
         return error_response('MATCH_NOT_FOUND', 'Match not found', 404)
 
     since = request.args.get('since')  # ISO8601 timestamp — only return messages after this
+    before = request.args.get('before')  # ISO8601 timestamp — page back through history
+    limit = request.args.get('limit', type=int)
+    # One row past the page tells us whether anything older exists
+    fetch_limit = None
+    if limit is not None:
+        limit = max(1, min(limit, MESSAGE_PAGE_MAX))
+        fetch_limit = limit + 1
+
+    partner_is_typing = is_typing(match_id, partner_id)
+    etag = versions.compute_etag(
+        user_id, request.full_path, partner_is_typing,
+        *versions.get_stamps(f'messages:{match_id}')
+    )
+    cached = versions.not_modified(etag)
+    if cached:
+        return cached
 
     client = get_client()
+    watermarks = get_read_watermarks(match_id, [user_id, partner_id])
 
-    # Messages
+    # Live messages, newest first when paging so the limit keeps the latest ones
     query = client.query(kind='Message')
     query.add_filter('matchId', '=', match_id)
-
-    # Reactions
-    reaction_query = client.query(kind='MessageReaction')
-    reaction_query.add_filter('matchId', '=', match_id)
-    all_reactions = list(reaction_query.fetch())
-
-    reactions_by_message = {}
-    for r in all_reactions:
-        mid = r.get('messageId')
-        if mid not in reactions_by_message:
-            reactions_by_message[mid] = []
-        reactions_by_message[mid].append({
-            'emoji': r.get('emoji'),
-            'userId': r.get('userId'),
-            'createdAt': r.get('createdAt')
-        })
+    if since:
+        query.add_filter('createdAt', '>', since)
+    if before:
+        query.add_filter('createdAt', '<', before)
+    if limit is not None:
+        query.order = ['-createdAt']
 
     messages = []
-    for msg in query.fetch():
-        if since and msg.get('createdAt', '') <= since:
-            continue
+    for msg in query.fetch(limit=fetch_limit):
         msg_id = msg.key.name or str(msg.key.id)
-        msg_dict = {
-            'id': msg_id,
-            'matchId': msg.get('matchId'),
-            'senderId': msg.get('senderId'),
-            'text': msg.get('text'),
-            'createdAt': msg.get('createdAt'),
-            'readBy': msg.get('readBy', [msg.get('senderId')]),
-            'reactions': reactions_by_message.get(msg_id, [])
-        }
-        if msg.get('type'):
-            msg_dict['type'] = msg.get('type')
-        if msg.get('metadata'):
-            msg_dict['metadata'] = msg.get('metadata')
-        messages.append(msg_dict)
+        messages.append(message_to_dict(msg_id, match_id, msg, watermarks))
+
+    # Older history packed into MessageBlocks; every block predates every live message
+    compacted_through = match.get('compactedThrough')
+    needs_blocks = (
+        compacted_through
+        and (not since or since < compacted_through)
+        and (fetch_limit is None or len(messages) < fetch_limit)
+    )
+    if needs_blocks:
+        block_query = client.query(kind='MessageBlock')
+        block_query.add_filter('matchId', '=', match_id)
+        if before:
+            block_query.add_filter('startAt', '<', before)
+        block_query.order = ['-startAt']
+        for block in block_query.fetch():
+            packed = [
+                item for item in compaction.unpack_block(block)
+                if (not since or item.get('createdAt', '') > since)
+                and (not before or item.get('createdAt', '') < before)
+            ]
+            for item in reversed(packed):
+                messages.append(message_to_dict(item['id'], match_id, item, watermarks))
+            if fetch_limit is not None and len(messages) >= fetch_limit:
+                break
+            if since and block.get('startAt', '') <= since:
+                break
 
     messages.sort(key=lambda m: m['createdAt'])
+    has_more = False
+    if limit is not None and len(messages) > limit:
+        messages = messages[-limit:]
+        has_more = True
 
-    # Typing indicator
-    partner_is_typing = False
-    typing_key = client.key('TypingIndicator', f'{match_id}_{partner_id}')
-    typing_entity = client.get(typing_key)
-    if typing_entity and typing_entity.get('isTyping'):
-        updated_at = typing_entity.get('updatedAt')
-        if updated_at:
-            try:
-                updated_time = datetime.fromisoformat(updated_at.replace('Z', '+00:00'))
-                now = datetime.now(pytz.UTC)
-                if (now - updated_time).total_seconds() < TYPING_EXPIRY_SECONDS:
-                    partner_is_typing = True
-            except (ValueError, TypeError):
-                pass
-
-    return jsonify({
+    return versions.with_etag(jsonify({
         'success': True,
         'data': {
             'messages': messages,
             'matchId': match_id,
+            'hasMore': has_more,
             'partnerIsTyping': partner_is_typing
         }
-    })
+    }), etag)
 
 
 @match_bp.route('/matches/<match_id>/messages', methods=['POST'])
@@ -496,7 +798,7 @@ def send_message(match_id):
     """Send a message to a specific match."""
     user_id = request.user_id
 
-    match, _ = get_match_for_user(match_id, user_id)
+    match, partner_id = get_match_for_user(match_id, user_id)
     if not match:
         return error_response('MATCH_NOT_FOUND', 'Match not found', 404)
 
@@ -520,16 +822,14 @@ def send_message(match_id):
         'matchId': match_id,
         'senderId': user_id,
         'text': text,
-        'readBy': [user_id],
         'createdAt': created_at
     })
 
-    # Cache lastMessage on the Match entity so get_matches avoids a message scan
-    match['lastMessageText'] = text
-    match['lastMessageSenderId'] = user_id
-    match['lastMessageCreatedAt'] = created_at
-
-    client.put_multi([entity, match])
+    client.put(entity)
+    # Summary for get_matches lives outside the Match so chat bursts don't contend on it
+    record_last_message(match_id, text, user_id, created_at)
+    counters.increment(counters.unread_counter(match_id, partner_id))
+    bump_match_versions(match_id, user_id, partner_id)
 
     return jsonify({
         'success': True,
@@ -558,29 +858,36 @@ def add_reaction(match_id, message_id):
     if not match:
         return error_response('MATCH_NOT_FOUND', 'Match not found', 404)
 
-    client = get_client()
-    msg_key = client.key('Message', message_id)
-    message = client.get(msg_key)
-
-    if not message or message.get('matchId') != match_id:
-        return error_response('MESSAGE_NOT_FOUND', 'Message not found', 404)
-
     data = request.get_json()
     emoji = data.get('emoji', '')
 
     if emoji not in ALLOWED_REACTIONS:
         return error_response('VALIDATION_ERROR', f'Invalid reaction. Allowed: {", ".join(ALLOWED_REACTIONS)}')
 
-    reaction_key = client.key('MessageReaction', f'{message_id}_{user_id}_{emoji}')
-    reaction_entity = Entity(reaction_key)
-    reaction_entity.update({
-        'messageId': message_id,
-        'matchId': match_id,
-        'userId': user_id,
-        'emoji': emoji,
-        'createdAt': datetime.utcnow().isoformat() + 'Z'
-    })
-    client.put(reaction_entity)
+    client = get_client()
+    msg_key = client.key('Message', message_id)
+    now = datetime.utcnow().isoformat() + 'Z'
+
+    def apply():
+        # Reactions live on the Message as {emoji: {userId: createdAt}}
+        message = client.get(msg_key)
+        if not message or message.get('matchId') != match_id:
+            return None
+        created_at, changed = _add_reaction(message, user_id, emoji, now)
+        if changed:
+            exclude_from_indexes(message, 'reactions')
+            client.put(message)
+        return created_at
+
+    created_at = run_in_transaction(apply)
+    if created_at is None:
+        created_at = _update_compacted_message(
+            match, match_id, message_id,
+            lambda item: _add_reaction(item, user_id, emoji, now)[0]
+        )
+    if created_at is None:
+        return error_response('MESSAGE_NOT_FOUND', 'Message not found', 404)
+    bump_match_versions(match_id)
 
     return jsonify({
         'success': True,
@@ -589,7 +896,7 @@ def add_reaction(match_id, message_id):
                 'messageId': message_id,
                 'userId': user_id,
                 'emoji': emoji,
-                'createdAt': reaction_entity.get('createdAt')
+                'createdAt': created_at
             }
         }
     })
@@ -607,13 +914,25 @@ def remove_reaction(match_id, message_id, emoji):
 
     client = get_client()
     msg_key = client.key('Message', message_id)
-    message = client.get(msg_key)
 
-    if not message or message.get('matchId') != match_id:
+    def apply():
+        message = client.get(msg_key)
+        if not message or message.get('matchId') != match_id:
+            return False
+        if _remove_reaction(message, user_id, emoji):
+            client.put(message)
+        # A reaction from before aggregates may still have its own row; drop
+        # it so the message_reaction_aggregates backfill can't restore it
+        client.delete(client.key('MessageReaction', f'{message_id}_{user_id}_{emoji}'))
+        return True
+
+    found = run_in_transaction(apply) or _update_compacted_message(
+        match, match_id, message_id,
+        lambda item: _remove_reaction(item, user_id, emoji) or True
+    )
+    if not found:
         return error_response('MESSAGE_NOT_FOUND', 'Message not found', 404)
-
-    reaction_key = client.key('MessageReaction', f'{message_id}_{user_id}_{emoji}')
-    client.delete(reaction_key)
+    bump_match_versions(match_id)
 
     return jsonify({
         'success': True,
@@ -640,23 +959,39 @@ def mark_messages_read(match_id):
     client = get_client()
 
     keys = [client.key('Message', msg_id) for msg_id in message_ids]
-    fetched = client.get_multi(keys)
-
-    to_update = []
-    for message in fetched:
-        if message and message.get('matchId') == match_id:
-            read_by = message.get('readBy', [])
-            if user_id not in read_by:
-                read_by.append(user_id)
-                message['readBy'] = read_by
-                to_update.append(message)
-
-    if to_update:
-        client.put_multi(to_update)
+    fetched = [m for m in client.get_multi(keys) if m and m.get('matchId') == match_id]
+    if not fetched:
+        return jsonify({'success': True, 'data': {'updatedCount': 0}})
+
+    # Read state is a single per-user watermark: everything up to the newest
+    # listed message counts as read, so this is one write regardless of count.
+    read_up_to = max(m.get('createdAt', '') for m in fetched)
+    state_key = _read_state_key(client, match_id, user_id)
+
+    def advance():
+        state = client.get(state_key)
+        previous = (state.get('lastReadAt') if state else None) or ''
+        if read_up_to > previous:
+            state = Entity(state_key)
+            state.update({
+                'matchId': match_id,
+                'userId': user_id,
+                'lastReadAt': read_up_to,
+            })
+            client.put(state)
+        counters.reset(counters.unread_counter(match_id, user_id))
+        return previous
+
+    previous = run_in_transaction(advance)
+    bump_match_versions(match_id, user_id)
+    updated_count = sum(
+        1 for m in fetched
+        if m.get('senderId') != user_id and m.get('createdAt', '') > previous
+    )
 
     return jsonify({
         'success': True,
-        'data': {'updatedCount': len(to_update)}
+        'data': {'updatedCount': updated_count}
     })
 
 
@@ -671,22 +1006,13 @@ def update_typing(match_id):
         return error_response('MATCH_NOT_FOUND', 'Match not found', 404)
 
     data = request.get_json()
-    is_typing = data.get('isTyping', False)
+    typing = bool(data.get('isTyping', False))
 
-    client = get_client()
-    typing_key = client.key('TypingIndicator', f'{match_id}_{user_id}')
-    typing_entity = Entity(typing_key)
-    typing_entity.update({
-        'matchId': match_id,
-        'userId': user_id,
-        'isTyping': is_typing,
-        'updatedAt': datetime.utcnow().isoformat() + 'Z'
-    })
-    client.put(typing_entity)
+    set_typing(match_id, user_id, typing)
 
     return jsonify({
         'success': True,
-        'data': {'isTyping': is_typing}
+        'data': {'isTyping': typing}
     })
 
 
@@ -700,21 +1026,7 @@ def get_typing(match_id):
     if not match:
         return error_response('MATCH_NOT_FOUND', 'Match not found', 404)
 
-    client = get_client()
-    typing_key = client.key('TypingIndicator', f'{match_id}_{partner_id}')
-    typing_entity = client.get(typing_key)
-
-    partner_is_typing = False
-    if typing_entity and typing_entity.get('isTyping'):
-        updated_at = typing_entity.get('updatedAt')
-        if updated_at:
-            try:
-                updated_time = datetime.fromisoformat(updated_at.replace('Z', '+00:00'))
-                now = datetime.now(pytz.UTC)
-                if (now - updated_time).total_seconds() < TYPING_EXPIRY_SECONDS:
-                    partner_is_typing = True
-            except (ValueError, TypeError):
-                pass
+    partner_is_typing = is_typing(match_id, partner_id)
 
     return jsonify({
         'success': True,
@@ -729,30 +1041,48 @@ def get_typing(match_id):
 @match_bp.route('/matches/<match_id>/compatible-times', methods=['GET'])
 @require_auth
 def get_compatible_times(match_id):
-    """Compute overlap of both users' expanded availability + shared sports."""
+    """Overlap of both users' availability, as weekly hours and as open slots
+    on concrete dates (`from`, default today, for `days` days), plus shared sports."""
     user_id = request.user_id
 
     match, partner_id = get_match_for_user(match_id, user_id)
     if not match:
         return error_response('MATCH_NOT_FOUND', 'Match not found', 404)
 
-    user = get_user_by_id(user_id)
-    partner = get_user_by_id(partner_id)
+    try:
+        start_date = (datetime.strptime(request.args['from'], '%Y-%m-%d').date()
+                      if request.args.get('from') else local_today())
+    except ValueError:
+        return error_response('VALIDATION_ERROR', 'from must be YYYY-MM-DD')
+    days = max(1, min(request.args.get('days', OPEN_SLOT_DAYS, type=int), OPEN_SLOT_DAYS_MAX))
+
+    client = get_client()
+    users = {
+        (u.key.name or str(u.key.id)): u
+        for u in client.get_multi([client.key('User', user_id), client.key('User', partner_id)]) if u
+    }
+    user, partner = users.get(user_id), users.get(partner_id)
 
     if not user or not partner:
         return error_response('USER_NOT_FOUND', 'User not found', 404)
 
-    # Expand availability
-    user_avail = expand_availability(user.get('availability', {}))
-    partner_avail = expand_availability(partner.get('availability', {}))
+    # Both weekly masks come cached on the profiles; the overlap is one AND
+    shared_mask = availability.user_mask(user) & availability.user_mask(partner)
+    compatible_times = {
+        day: [f'{h}:00' for h in hours]
+        for day, hours in availability.weekly_hours(shared_mask).items()
+    }
 
-    # Find overlapping hours per day
-    compatible_times = {}
-    all_days = set(user_avail.keys()) & set(partner_avail.keys())
-    for day in all_days:
-        overlap = sorted(user_avail[day] & partner_avail[day])
-        if overlap:
-            compatible_times[day] = [f'{h}:00' for h in overlap]
+    # Hours either user already has an accepted session in the range
+    end_date = start_date + timedelta(days=days)
+    query = client.query(kind='Session')
+    query.add_filter('userIds', 'IN', [user_id, partner_id])
+    query.add_filter('status', '=', 'accepted')
+    query.add_filter('startsAt', '>=', session_starts_at(start_date.isoformat(), 0))
+    query.add_filter('startsAt', '<', session_starts_at(end_date.isoformat(), 0))
+    booked = booked_hours(query.fetch())
+
+    open_slots = availability.open_slots(shared_mask, start_date, days, booked)
 
     # Find shared sports
     user_sports = {s.get('sport', '').lower(): s for s in user.get('sports', [])}
@@ -770,6 +1100,7 @@ def get_compatible_times(match_id):
         'success': True,
         'data': {
             'compatibleTimes': compatible_times,
+            'openSlots': open_slots,
             'sharedSports': shared_sports
         }
     })
@@ -807,76 +1138,97 @@ def create_session(match_id):
 
     client = get_client()
     created_at = datetime.utcnow().isoformat() + 'Z'
-
-    # Supersede any existing pending or accepted sessions BEFORE creating the new one
-    # so the new session is never included in this query.
-    existing_query = client.query(kind='Session')
-    existing_query.add_filter('matchId', '=', match_id)
-    superseded = []
-    has_existing_active = False
-    for existing_session in existing_query.fetch():
-        if existing_session.get('status') in ('pending', 'accepted'):
-            has_existing_active = True
-            existing_session['status'] = 'superseded'
-            existing_session['updatedAt'] = created_at
-            superseded.append(existing_session)
-
     session_id = str(uuid.uuid4())
-    session_entity = Entity(client.key('Session', session_id))
-    session_entity.update({
-        'matchId': match_id,
-        'proposerId': user_id,
-        'responderId': partner_id,
-        'sport': sport,
-        'day': day,
-        'date': date,
-        'startHour': start_hour,
-        'endHour': end_hour,
-        'location': location,
-        'status': 'pending',
-        'isChangeProposal': has_existing_active,
-        'createdAt': created_at,
-        'updatedAt': created_at,
-    })
+    match_key = client.key('Match', match_id)
+    pointer_key = client.key('ActiveSession', match_id)
 
-    # Use different message text when modifying an existing session
     proposer = get_user_by_id(user_id)
     proposer_name = proposer.get('displayName', 'Someone') if proposer else 'Someone'
-    if has_existing_active:
-        system_text = (
-            f'{proposer_name} proposed changes to the session: '
-            f'{sport} on {day}, {date_display} from {start_hour}:00 to {end_hour}:00'
-        )
-    else:
-        system_text = (
-            f'{proposer_name} proposed a {sport} session on '
-            f'{day}, {date_display} from {start_hour}:00 to {end_hour}:00'
-        )
 
-    msg_id = str(uuid.uuid4())
-    msg_entity = Entity(client.key('Message', msg_id))
-    msg_entity.update({
-        'matchId': match_id,
-        'senderId': user_id,
-        'text': system_text,
-        'type': 'session_proposal',
-        'metadata': {
-            'sessionId': session_id,
+    # Matches from before the pointer existed: find their active sessions
+    # here, since the (matchId, status) query can't run in the transaction
+    legacy_keys = []
+    if client.get(pointer_key) is None:
+        legacy_keys = [s.key for s in legacy_active_sessions(client, match_id)]
+
+    def apply():
+        # Supersede the current session and repoint the match at the new one
+        # in one transaction, so concurrent proposals can't both stay active.
+        # The pointer lives apart from the Match, which proposals don't write.
+        if client.get(match_key) is None:
+            return None, None
+        pointer = client.get(pointer_key)
+        if pointer is None:
+            pointer = Entity(pointer_key)
+            pointer['matchId'] = match_id
+            superseded = [s for s in client.get_multi(legacy_keys)
+                          if s.get('status') in ACTIVE_SESSION_STATUSES]
+        else:
+            superseded = pointed_session(client, pointer)
+        for existing_session in superseded:
+            existing_session['status'] = 'superseded'
+            existing_session['updatedAt'] = created_at
+        has_existing_active = bool(superseded)
+
+        session_entity = Entity(client.key('Session', session_id))
+        session_entity.update({
+            'matchId': match_id,
+            'proposerId': user_id,
+            'responderId': partner_id,
+            'userIds': [user_id, partner_id],
             'sport': sport,
             'day': day,
+            'date': date,
             'startHour': start_hour,
             'endHour': end_hour,
+            'startsAt': session_starts_at(date, start_hour, day, created_at),
             'location': location,
-        },
-        'readBy': [user_id],
-        'createdAt': created_at,
-    })
+            'status': 'pending',
+            'isChangeProposal': has_existing_active,
+            'createdAt': created_at,
+            'updatedAt': created_at,
+        })
+        pointer['sessionId'] = session_id
+        pointer['updatedAt'] = created_at
+
+        # Use different message text when modifying an existing session
+        if has_existing_active:
+            system_text = (
+                f'{proposer_name} proposed changes to the session: '
+                f'{sport} on {day}, {date_display} from {start_hour}:00 to {end_hour}:00'
+            )
+        else:
+            system_text = (
+                f'{proposer_name} proposed a {sport} session on '
+                f'{day}, {date_display} from {start_hour}:00 to {end_hour}:00'
+            )
+
+        msg_entity = Entity(client.key('Message', str(uuid.uuid4())))
+        msg_entity.update({
+            'matchId': match_id,
+            'senderId': user_id,
+            'text': system_text,
+            'type': 'session_proposal',
+            'metadata': {
+                'sessionId': session_id,
+                'sport': sport,
+                'day': day,
+                'startHour': start_hour,
+                'endHour': end_hour,
+                'location': location,
+            },
+            'createdAt': created_at,
+        })
+
+        client.put_multi(superseded + [pointer, session_entity, msg_entity])
+        return session_entity, system_text
 
-    # Cache lastMessage on the Match entity
-    match['lastMessageText'] = system_text
-    match['lastMessageSenderId'] = user_id
-    match['lastMessageCreatedAt'] = created_at
-    client.put_multi(superseded + [session_entity, msg_entity, match])
+    session_entity, system_text = run_in_transaction(apply)
+    if session_entity is None:
+        return error_response('MATCH_NOT_FOUND', 'Match not found', 404)
+    record_last_message(match_id, system_text, user_id, created_at)
+    counters.increment(counters.unread_counter(match_id, partner_id))
+    bump_match_versions(match_id, user_id, partner_id, calendar=True)
 
     return jsonify({
         'success': True,
@@ -890,52 +1242,59 @@ def update_session(match_id, session_id):
     """Accept, decline, or cancel a session."""
     user_id = request.user_id
 
-    match, _ = get_match_for_user(match_id, user_id)
+    match, partner_id = get_match_for_user(match_id, user_id)
     if not match:
         return error_response('MATCH_NOT_FOUND', 'Match not found', 404)
 
-    client = get_client()
-    session_key = client.key('Session', session_id)
-    session = client.get(session_key)
-
-    if not session or session.get('matchId') != match_id:
-        return error_response('SESSION_NOT_FOUND', 'Session not found', 404)
-
     data = request.get_json()
     action = data.get('action')  # "accept", "decline", or "cancel"
 
     if action not in ('accept', 'decline', 'cancel'):
         return error_response('VALIDATION_ERROR', 'action must be "accept", "decline", or "cancel"')
 
+    client = get_client()
+    session_key = client.key('Session', session_id)
     now = datetime.utcnow().isoformat() + 'Z'
 
-    if action == 'cancel':
-        # Either participant can cancel a pending or accepted session
-        if session.get('status') not in ('pending', 'accepted'):
-            return error_response('SESSION_NOT_ACTIVE', 'Session is not active')
-        session['status'] = 'cancelled'
-    else:
-        # Accept / decline — responder only, must be pending
-        if session.get('responderId') != user_id:
-            return error_response('NOT_RESPONDER', 'Only the responder can accept/decline', 403)
-        if session.get('status') != 'pending':
-            return error_response('SESSION_NOT_PENDING', 'Session is no longer pending')
-        session['status'] = 'accepted' if action == 'accept' else 'declined'
-
-    session['updatedAt'] = now
-
-    if action == 'accept':
-        # Clean up superseded sessions now that a new version is confirmed
-        cleanup_query = client.query(kind='Session')
-        cleanup_query.add_filter('matchId', '=', match_id)
-        keys_to_delete = [
-            s.key for s in cleanup_query.fetch()
-            if s.get('status') == 'superseded' and s.key.name != session_id
-        ]
-        if keys_to_delete:
-            client.delete_multi(keys_to_delete)
-
-    client.put(session)
+    def apply():
+        # Change the status and clear the match's pointer together, so a
+        # concurrent proposal can't be left pointing at an ended session
+        session = client.get(session_key)
+        if not session or session.get('matchId') != match_id:
+            return 'not_found', None
+
+        if action == 'cancel':
+            # Either participant can cancel a pending or accepted session
+            if session.get('status') not in ('pending', 'accepted'):
+                return 'not_active', None
+            session['status'] = 'cancelled'
+        else:
+            # Accept / decline — responder only, must be pending
+            if session.get('responderId') != user_id:
+                return 'not_responder', None
+            if session.get('status') != 'pending':
+                return 'not_pending', None
+            session['status'] = 'accepted' if action == 'accept' else 'declined'
+        session['updatedAt'] = now
+
+        # Superseded versions are left to the superseded_sessions sweep
+        to_put = [session]
+        if session['status'] not in ACTIVE_SESSION_STATUSES:
+            pointer = release_active_session(client, match_id, session_id, now)
+            if pointer is not None:
+                to_put.append(pointer)
+        client.put_multi(to_put)
+        return None, session
+
+    error, session = run_in_transaction(apply)
+    if error == 'not_found':
+        return error_response('SESSION_NOT_FOUND', 'Session not found', 404)
+    if error == 'not_active':
+        return error_response('SESSION_NOT_ACTIVE', 'Session is not active')
+    if error == 'not_responder':
+        return error_response('NOT_RESPONDER', 'Only the responder can accept/decline', 403)
+    if error == 'not_pending':
+        return error_response('SESSION_NOT_PENDING', 'Session is no longer pending')
 
     # Auto-create system message
     responder = get_user_by_id(user_id)
@@ -958,19 +1317,13 @@ def update_session(match_id, session_id):
             'sessionId': session_id,
             'action': action,
         },
-        'readBy': [user_id],
         'createdAt': now,
     })
 
-    # Cache lastMessage on the Match entity
-    match_entity = client.get(client.key('Match', match_id))
-    if match_entity:
-        match_entity['lastMessageText'] = system_text
-        match_entity['lastMessageSenderId'] = user_id
-        match_entity['lastMessageCreatedAt'] = now
-        client.put_multi([msg_entity, match_entity])
-    else:
-        client.put(msg_entity)
+    client.put(msg_entity)
+    record_last_message(match_id, system_text, user_id, now)
+    counters.increment(counters.unread_counter(match_id, partner_id))
+    bump_match_versions(match_id, user_id, partner_id, calendar=True)
 
     return jsonify({
         'success': True,
@@ -1004,23 +1357,41 @@ def get_sessions(match_id):
 @match_bp.route('/sessions/upcoming', methods=['GET'])
 @require_auth
 def get_upcoming_sessions():
-    """Get all accepted sessions for the current user."""
+    """Get the current user's accepted sessions in a time window, soonest first.
+
+    `from` defaults to now; `to` is optional. Both are ISO 8601, converted to
+    UTC (naive values are taken as UTC) before comparing with startsAt.
+    """
     user_id = request.user_id
     client = get_client()
 
-    sessions = []
-    for field in ['proposerId', 'responderId']:
-        query = client.query(kind='Session')
-        query.add_filter(field, '=', user_id)
-        query.add_filter('status', '=', 'accepted')
-        for s in query.fetch():
-            sessions.append(session_to_dict(s))
-
-    sessions.sort(key=lambda s: s.get('createdAt', ''), reverse=True)
+    try:
+        window_start = utc_timestamp(request.args.get('from') or datetime.utcnow().isoformat())
+        window_end = utc_timestamp(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return error_response('VALIDATION_ERROR', 'from and to must be ISO 8601 timestamps')
+    if window_end and window_end <= window_start:
+        return error_response('VALIDATION_ERROR', 'to must be after from')
+    cursor = request.args.get('cursor')
+    limit = max(1, min(request.args.get('limit', SESSION_PAGE_SIZE, type=int), SESSION_PAGE_MAX))
+
+    # Served by the (userIds, status, startsAt) composite index
+    query = client.query(kind='Session')
+    query.add_filter('userIds', '=', user_id)
+    query.add_filter('status', '=', 'accepted')
+    query.add_filter('startsAt', '>=', window_start)
+    if window_end:
+        query.add_filter('startsAt', '<', window_end)
+    query.order = ['startsAt']
+
+    try:
+        entities, next_cursor = fetch_page(query, limit, cursor)
+    except ValueError:
+        return error_response('VALIDATION_ERROR', 'Invalid cursor')
 
     return jsonify({
         'success': True,
-        'data': {'sessions': sessions}
+        'data': {'sessions': [session_to_dict(s) for s in entities], 'nextCursor': next_cursor}
     })
 
 
@@ -1034,15 +1405,8 @@ def get_active_session(match_id):
     if not match:
         return error_response('MATCH_NOT_FOUND', 'Match not found', 404)
 
-    client = get_client()
-    query = client.query(kind='Session')
-    query.add_filter('matchId', '=', match_id)
-
-    active = None
-    for s in query.fetch():
-        if s.get('status') in ('pending', 'accepted'):
-            if active is None or s.get('createdAt', '') > active.get('createdAt', ''):
-                active = s
+    sessions = active_sessions(get_client(), match_id)
+    active = sessions[-1] if sessions else None
 
     return jsonify({
         'success': True,
@@ -1056,24 +1420,32 @@ def cancel_session(match_id, session_id):
     """Cancel a session (either participant can cancel)."""
     user_id = request.user_id
 
-    match, _ = get_match_for_user(match_id, user_id)
+    match, partner_id = get_match_for_user(match_id, user_id)
     if not match:
         return error_response('MATCH_NOT_FOUND', 'Match not found', 404)
 
     client = get_client()
     session_key = client.key('Session', session_id)
-    session = client.get(session_key)
+    now = datetime.utcnow().isoformat() + 'Z'
 
-    if not session or session.get('matchId') != match_id:
-        return error_response('SESSION_NOT_FOUND', 'Session not found', 404)
+    def apply():
+        session = client.get(session_key)
+        if not session or session.get('matchId') != match_id:
+            return 'not_found', None
+        if session.get('status') not in ACTIVE_SESSION_STATUSES:
+            return 'not_active', None
+        session['status'] = 'cancelled'
+        session['updatedAt'] = now
+        pointer = release_active_session(client, match_id, session_id, now)
+        client.put_multi([session] + ([pointer] if pointer is not None else []))
+        return None, session
 
-    if session.get('status') not in ('pending', 'accepted'):
+    error, session = run_in_transaction(apply)
+    if error == 'not_found':
+        return error_response('SESSION_NOT_FOUND', 'Session not found', 404)
+    if error == 'not_active':
         return error_response('SESSION_NOT_ACTIVE', 'Session is not active')
 
-    now = datetime.utcnow().isoformat() + 'Z'
-    session['status'] = 'cancelled'
-    session['updatedAt'] = now
-
     canceller = get_user_by_id(user_id)
     canceller_name = canceller.get('displayName', 'Someone') if canceller else 'Someone'
     system_text = f'{canceller_name} cancelled the {session.get("sport")} session'
@@ -1088,18 +1460,13 @@ def cancel_session(match_id, session_id):
             'sessionId': session_id,
             'action': 'cancel',
         },
-        'readBy': [user_id],
         'createdAt': now,
     })
 
-    match_entity = client.get(client.key('Match', match_id))
-    if match_entity:
-        match_entity['lastMessageText'] = system_text
-        match_entity['lastMessageSenderId'] = user_id
-        match_entity['lastMessageCreatedAt'] = now
-        client.put_multi([session, msg_entity, match_entity])
-    else:
-        client.put_multi([session, msg_entity])
+    client.put(msg_entity)
+    record_last_message(match_id, system_text, user_id, now)
+    counters.increment(counters.unread_counter(match_id, partner_id))
+    bump_match_versions(match_id, user_id, partner_id, calendar=True)
 
     return jsonify({
         'success': True,
@@ -1,14 +1,41 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
+from contextlib import contextmanager
 from datetime import datetime
+import json
+import threading
 import uuid
 
-from db import get_client, Entity
+from google.api_core.exceptions import Aborted, Conflict
+
+from db import get_client, Entity, fetch_page, run_in_transaction
 from models import meetup_to_dict, user_to_dict
 from middleware import require_auth
-from auth import get_user_by_id
+from auth import get_user_by_id, picture_url
+from calendar_feed import calendar_scope
+from ephemeral import MemoryStore
+import availability
+import geo
+import tasks
+import versions
 
 meetup_bp = Blueprint('meetup', __name__)
 
+MEETUP_PAGE_SIZE = 50
+MEETUP_PAGE_MAX = 100
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_PAGE_MAX = 100
+# Serialized feed pages are shared by every request in this process. Writes
+# on this instance evict the pages they can appear on; changes made on other
+# instances show up once the TTL runs out.
+FEED_CACHE_TTL_SECONDS = 15
+JOIN_MODES = ('direct', 'queue')
+NEARBY_DEFAULT_RADIUS_KM = 2.0
+NEARBY_MAX_RESULTS = 100
+BEST_TIMES_DEFAULT = 5
+BEST_TIMES_MAX = 24
+# Queued join requests admitted per transaction on the Meetup
+JOIN_ADMIT_BATCH = 50
+
 
 def is_expired(entity):
     """Return True if the meetup date is before today (expired 1 day after scheduled date)."""
@@ -19,6 +46,56 @@ def is_expired(entity):
     return date_str < today
 
 
+_feed_cache = MemoryStore()
+# {cache key: [lock, requests using it]}; a slow query only holds up
+# requests for the same page
+_feed_fill_locks = {}
+_feed_fill_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _feed_fill_lock(cache_key):
+    """Serialize cache fills per feed key; the lock is dropped once unused."""
+    with _feed_fill_locks_guard:
+        entry = _feed_fill_locks.setdefault(cache_key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _feed_fill_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _feed_fill_locks[cache_key]
+
+
+def meetups_changed(meetup, *user_ids):
+    """Record a change to one meetup: drop the cached feed pages it can be on.
+
+    `user_ids` are the users whose calendar feeds include the change.
+    """
+    sport, date = meetup.get('sportKey') or sport_key(meetup.get('sport')), meetup.get('date')
+    # Cache keys are (today, sport, date, cursor, limit); '' means unfiltered
+    _feed_cache.delete_where(lambda key: key[1] in ('', sport) and key[2] in ('', date))
+    versions.bump(*(calendar_scope(uid) for uid in user_ids))
+
+
+def sport_key(sport):
+    """Case-folded sport name, stored as `sportKey` so sport filters run in Datastore."""
+    return (sport or '').strip().lower()
+
+
+def parse_coordinates(lat, lng):
+    """Validated (lat, lng) floats, or None if either is missing or out of range."""
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
 def error_response(code, message, status=400):
     return jsonify({
         'success': False,
@@ -44,6 +121,16 @@ def create_meetup():
     if not sport or not title or not date or not time:
         return error_response('VALIDATION_ERROR', 'sport, title, date, and time are required')
 
+    join_mode = data.get('joinMode', 'direct')
+    if join_mode not in JOIN_MODES:
+        return error_response('VALIDATION_ERROR', f'joinMode must be one of: {", ".join(JOIN_MODES)}')
+
+    coords = None
+    if data.get('lat') is not None or data.get('lng') is not None:
+        coords = parse_coordinates(data.get('lat'), data.get('lng'))
+        if not coords:
+            return error_response('VALIDATION_ERROR', 'lat and lng must be valid coordinates')
+
     client = get_client()
     meetup_id = str(uuid.uuid4())
     created_at = datetime.utcnow().isoformat() + 'Z'
@@ -53,6 +140,7 @@ def create_meetup():
         'hostId': user_id,
         'hostName': user.get('displayName', 'Unknown'),
         'sport': sport,
+        'sportKey': sport_key(sport),
         'title': title,
         'description': data.get('description', ''),
         'date': date,
@@ -60,11 +148,16 @@ def create_meetup():
         'location': data.get('location', ''),
         'skillLevels': data.get('skillLevels', []),
         'playerLimit': data.get('playerLimit', 10),
+        'joinMode': join_mode,
         'participants': [user_id],
         'status': 'active',
         'createdAt': created_at,
+        'updatedAt': created_at,
     })
+    if coords:
+        entity.update({'lat': coords[0], 'lng': coords[1], 'geoCells': geo.cells_for(*coords)})
     client.put(entity)
+    meetups_changed(entity, user_id)
 
     return jsonify({
         'success': True,
@@ -75,29 +168,103 @@ def create_meetup():
 @meetup_bp.route('/meetups', methods=['GET'])
 @require_auth
 def list_meetups():
-    """List active future meetups, optional sport and date filters."""
-    sport_filter = request.args.get('sport')
-    date_filter = request.args.get('date')
+    """List active future meetups, optional sport and date filters.
+
+    Pages are served from the in-process feed cache without touching
+    Datastore; the ETag is a hash of the page body.
+    """
+    sport = sport_key(request.args.get('sport'))
+    date_filter = request.args.get('date') or ''
+    cursor = request.args.get('cursor') or ''
+    limit = max(1, min(request.args.get('limit', MEETUP_PAGE_SIZE, type=int), MEETUP_PAGE_MAX))
+
+    # The listing drops meetups as days pass, so today is part of the key
+    today = datetime.utcnow().date().isoformat()
+    cache_key = (today, sport, date_filter, cursor, limit)
+
+    page = _feed_cache.get(cache_key)
+    if page is None:
+        try:
+            with _feed_fill_lock(cache_key):
+                # Another request may have filled it while this one waited
+                page = _feed_cache.get(cache_key)
+                if page is None:
+                    page = _build_feed_page(today, sport, date_filter, cursor, limit)
+                    _feed_cache.set(cache_key, page, FEED_CACHE_TTL_SECONDS)
+        except ValueError:
+            return error_response('VALIDATION_ERROR', 'Invalid cursor')
+
+    body, etag = page
+    cached = versions.not_modified(etag)
+    if cached:
+        return cached
+    return versions.with_etag(current_app.response_class(body, mimetype='application/json'), etag)
+
+
+def _build_feed_page(today, sport, date_filter, cursor, limit):
+    """Query one feed page and return (serialized body, etag)."""
+    if date_filter and date_filter < today:
+        meetups, next_cursor = [], None
+    else:
+        # Served by the (status, [sportKey,] date, time) composite indexes
+        client = get_client()
+        query = client.query(kind='Meetup')
+        query.add_filter('status', '=', 'active')
+        if sport:
+            query.add_filter('sportKey', '=', sport)
+        if date_filter:
+            query.add_filter('date', '=', date_filter)
+            query.order = ['time']
+        else:
+            query.add_filter('date', '>=', today)
+            query.order = ['date', 'time']
+
+        entities, next_cursor = fetch_page(query, limit, cursor or None)
+        meetups = [meetup_to_dict(entity) for entity in entities]
+
+    body = json.dumps({
+        'success': True,
+        'data': {'meetups': meetups, 'nextCursor': next_cursor}
+    }, separators=(',', ':'))
+    return body, versions.compute_etag(body)
 
+
+@meetup_bp.route('/meetups/nearby', methods=['GET'])
+@require_auth
+def nearby_meetups():
+    """Active upcoming meetups within `radius` km of (lat, lng), nearest first."""
+    coords = parse_coordinates(request.args.get('lat'), request.args.get('lng'))
+    if not coords:
+        return error_response('VALIDATION_ERROR', 'lat and lng are required')
+    radius = request.args.get('radius', NEARBY_DEFAULT_RADIUS_KM, type=float)
+    if radius <= 0:
+        return error_response('VALIDATION_ERROR', 'radius must be positive')
+    try:
+        cells = geo.covering_cells(*coords, radius)
+    except ValueError as e:
+        return error_response('VALIDATION_ERROR', str(e))
+
+    # Only meetups in the covering cells are read; the exact distance check
+    # then drops those in the corners of the cell block
     client = get_client()
     query = client.query(kind='Meetup')
     query.add_filter('status', '=', 'active')
+    query.add_filter('geoCells', 'IN', cells)
+    query.add_filter('date', '>=', datetime.utcnow().date().isoformat())
 
     meetups = []
     for entity in query.fetch():
-        if is_expired(entity):
-            continue
-        if sport_filter and entity.get('sport', '').lower() != sport_filter.lower():
-            continue
-        if date_filter and entity.get('date') != date_filter:
-            continue
-        meetups.append(meetup_to_dict(entity))
+        distance = geo.distance_km(coords[0], coords[1], entity.get('lat'), entity.get('lng'))
+        if distance <= radius:
+            meetup = meetup_to_dict(entity)
+            meetup['distanceKm'] = round(distance, 2)
+            meetups.append(meetup)
 
-    meetups.sort(key=lambda m: m.get('date', '') + m.get('time', ''))
+    meetups.sort(key=lambda m: (m['distanceKm'], m['date'], m['time']))
 
     return jsonify({
         'success': True,
-        'data': {'meetups': meetups}
+        'data': {'meetups': meetups[:NEARBY_MAX_RESULTS]}
     })
 
 
@@ -106,57 +273,246 @@ def list_meetups():
 def my_meetups():
     """Get user's hosted and joined meetups."""
     user_id = request.user_id
+    upcoming = request.args.get('upcoming', '').lower() in ('1', 'true')
+    cursor = request.args.get('cursor')
+    limit = max(1, min(request.args.get('limit', MEETUP_PAGE_SIZE, type=int), MEETUP_PAGE_MAX))
     client = get_client()
 
+    # Hosts are always participants (they can't leave), so one equality
+    # filter on the indexed participants list covers hosted and joined meetups
     query = client.query(kind='Meetup')
+    query.add_filter('participants', '=', user_id)
+    if upcoming:
+        query.add_filter('status', '=', 'active')
+        query.add_filter('date', '>=', datetime.utcnow().date().isoformat())
+    else:
+        # Past meetups are moved to 'expired' by maintenance.py but stay in history
+        query.add_filter('status', 'IN', ['active', 'expired'])
+    query.order = ['date', 'time']
+
+    try:
+        entities, next_cursor = fetch_page(query, limit, cursor)
+    except ValueError:
+        return error_response('VALIDATION_ERROR', 'Invalid cursor')
+
+    return jsonify({
+        'success': True,
+        'data': {'meetups': [meetup_to_dict(e) for e in entities], 'nextCursor': next_cursor}
+    })
+
+
+def _join_request_key(client, meetup_id, user_id):
+    return client.key('MeetupJoinRequest', f'{meetup_id}_{user_id}')
+
+
+def _check_joinable(meetup, user_id):
+    """Return an (code, message, status) error for a join, or None if allowed."""
+    if not meetup or meetup.get('status') != 'active':
+        return 'MEETUP_NOT_FOUND', 'Meetup not found', 404
+    if is_expired(meetup):
+        return 'MEETUP_EXPIRED', 'This meetup has already passed', 410
+    participants = meetup.get('participants', [])
+    if user_id in participants:
+        return 'ALREADY_JOINED', 'You already joined this meetup', 400
+    if len(participants) >= meetup.get('playerLimit', 10):
+        return 'MEETUP_FULL', 'This meetup is full', 400
+    return None
 
-    meetups = []
-    for entity in query.fetch():
-        if entity.get('status') == 'cancelled':
-            continue
-        participants = entity.get('participants', [])
-        if user_id in participants or entity.get('hostId') == user_id:
-            meetups.append(meetup_to_dict(entity))
 
-    meetups.sort(key=lambda m: m.get('date', '') + m.get('time', ''))
+def enqueue_join(meetup_id, user_id):
+    """Record a join request and schedule a batch admission.
 
+    Each request is its own entity, so a rush of joins never contends on the
+    Meetup; admit_join_requests() then applies them in a few transactions.
+    Joining again while a request is pending keeps its place in the queue.
+    """
+    client = get_client()
+    key = _join_request_key(client, meetup_id, user_id)
+
+    def apply():
+        entity = client.get(key)
+        if entity and entity.get('status') == 'pending':
+            return entity
+        entity = Entity(key)
+        entity.update({
+            'meetupId': meetup_id,
+            'userId': user_id,
+            'status': 'pending',
+            'createdAt': datetime.utcnow().isoformat() + 'Z',
+        })
+        client.put(entity)
+        return entity
+
+    entity = run_in_transaction(apply)
+    schedule_admission(meetup_id)
+    return entity
+
+
+# {meetupId: another pass needed} for admissions queued or running in this
+# process, so a rush of joins runs one admission loop per meetup, not one each
+_admissions = {}
+_admissions_lock = threading.Lock()
+
+
+def schedule_admission(meetup_id):
+    """Run admit_join_requests() in the background unless it is already due.
+
+    If a run is already queued or in progress, it is asked to make one more
+    pass when it finishes, which picks up requests written after its query.
+    """
+    with _admissions_lock:
+        if meetup_id in _admissions:
+            _admissions[meetup_id] = True
+            return
+        _admissions[meetup_id] = False
+    tasks.defer(_run_admissions, meetup_id)
+
+
+def _run_admissions(meetup_id):
+    try:
+        while True:
+            admit_join_requests(meetup_id)
+            with _admissions_lock:
+                if not _admissions.get(meetup_id):
+                    _admissions.pop(meetup_id, None)
+                    return
+                _admissions[meetup_id] = False
+    except Exception:
+        # Leave nothing behind that would block the next schedule; the
+        # maintenance sweep retries whatever is still pending
+        with _admissions_lock:
+            _admissions.pop(meetup_id, None)
+        raise
+
+
+def admit_join_requests(meetup_id):
+    """Admit pending join requests in arrival order, up to the player limit.
+
+    Every batch is one transaction over the Meetup and its requests. Requests
+    that can't be admitted are marked with the reason. Returns the number admitted.
+    """
+    client = get_client()
+    admitted_total = 0
+
+    while True:
+        query = client.query(kind='MeetupJoinRequest')
+        query.add_filter('meetupId', '=', meetup_id)
+        query.add_filter('status', '=', 'pending')
+        query.order = ['createdAt']
+        query.keys_only()
+        keys = [e.key for e in query.fetch(limit=JOIN_ADMIT_BATCH)]
+        if not keys:
+            break
+
+        def apply(keys=keys):
+            meetup = client.get(client.key('Meetup', meetup_id))
+            admitted = []
+            now = datetime.utcnow().isoformat() + 'Z'
+            pending = [r for r in client.get_multi(keys) if r and r.get('status') == 'pending']
+            pending.sort(key=lambda r: r.get('createdAt', ''))
+            for join_request in pending:
+                error = _check_joinable(meetup, join_request.get('userId'))
+                if error:
+                    join_request['status'] = 'rejected'
+                    join_request['reason'] = error[0]
+                else:
+                    meetup['participants'] = meetup.get('participants', []) + [join_request.get('userId')]
+                    join_request['status'] = 'admitted'
+                    admitted.append(join_request.get('userId'))
+                join_request['updatedAt'] = now
+            if admitted:
+                meetup['updatedAt'] = now
+                client.put(meetup)
+            client.put_multi(pending)
+            return meetup, admitted
+
+        meetup, admitted = run_in_transaction(apply)
+        admitted_total += len(admitted)
+        if admitted:
+            meetups_changed(meetup, *admitted)
+        if len(keys) < JOIN_ADMIT_BATCH:
+            break
+
+    return admitted_total
+
+
+def _queued_response(join_request):
     return jsonify({
         'success': True,
-        'data': {'meetups': meetups}
-    })
+        'data': {
+            'status': 'queued',
+            'joinRequest': {
+                'meetupId': join_request.get('meetupId'),
+                'status': join_request.get('status'),
+                'createdAt': join_request.get('createdAt'),
+            }
+        }
+    }), 202
 
 
 @meetup_bp.route('/meetups/<meetup_id>/join', methods=['POST'])
 @require_auth
 def join_meetup(meetup_id):
-    """Join a meetup."""
+    """Join a meetup.
+
+    Queue-mode meetups, and direct joins that keep losing the transaction
+    race, are answered 202 with a queued join request instead.
+    """
     user_id = request.user_id
     client = get_client()
-
     key = client.key('Meetup', meetup_id)
-    meetup = client.get(key)
-
-    if not meetup or meetup.get('status') != 'active':
-        return error_response('MEETUP_NOT_FOUND', 'Meetup not found', 404)
 
-    if is_expired(meetup):
-        return error_response('MEETUP_EXPIRED', 'This meetup has already passed', 410)
+    meetup = client.get(key)
+    error = _check_joinable(meetup, user_id)
+    if error:
+        return error_response(*error)
+
+    if meetup.get('joinMode') == 'queue':
+        return _queued_response(enqueue_join(meetup_id, user_id))
+
+    def apply():
+        meetup = client.get(key)
+        error = _check_joinable(meetup, user_id)
+        if error:
+            return None, error
+        meetup['participants'] = meetup.get('participants', []) + [user_id]
+        meetup['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
+        client.put(meetup)
+        return meetup, None
+
+    try:
+        meetup, error = run_in_transaction(apply)
+    except (Aborted, Conflict):
+        return _queued_response(enqueue_join(meetup_id, user_id))
+    if error:
+        return error_response(*error)
+    meetups_changed(meetup, user_id)
 
-    participants = meetup.get('participants', [])
-    if user_id in participants:
-        return error_response('ALREADY_JOINED', 'You already joined this meetup')
+    return jsonify({
+        'success': True,
+        'data': {'meetup': meetup_to_dict(meetup)}
+    })
 
-    player_limit = meetup.get('playerLimit', 10)
-    if len(participants) >= player_limit:
-        return error_response('MEETUP_FULL', 'This meetup is full')
 
-    participants.append(user_id)
-    meetup['participants'] = participants
-    client.put(meetup)
+@meetup_bp.route('/meetups/<meetup_id>/join', methods=['GET'])
+@require_auth
+def get_join_request(meetup_id):
+    """Status of the current user's queued join request."""
+    client = get_client()
+    join_request = client.get(_join_request_key(client, meetup_id, request.user_id))
+    if not join_request:
+        return error_response('JOIN_REQUEST_NOT_FOUND', 'No join request for this meetup', 404)
 
     return jsonify({
         'success': True,
-        'data': {'meetup': meetup_to_dict(meetup)}
+        'data': {
+            'joinRequest': {
+                'meetupId': join_request.get('meetupId'),
+                'status': join_request.get('status'),
+                'reason': join_request.get('reason'),
+                'createdAt': join_request.get('createdAt'),
+            }
+        }
     })
 
 
@@ -166,23 +522,26 @@ def leave_meetup(meetup_id):
     """Leave a meetup (not host)."""
     user_id = request.user_id
     client = get_client()
-
     key = client.key('Meetup', meetup_id)
-    meetup = client.get(key)
-
-    if not meetup or meetup.get('status') != 'active':
-        return error_response('MEETUP_NOT_FOUND', 'Meetup not found', 404)
-
-    if meetup.get('hostId') == user_id:
-        return error_response('HOST_CANNOT_LEAVE', 'Host cannot leave. Cancel the meetup instead.')
 
-    participants = meetup.get('participants', [])
-    if user_id not in participants:
-        return error_response('NOT_JOINED', 'You are not in this meetup')
-
-    participants.remove(user_id)
-    meetup['participants'] = participants
-    client.put(meetup)
+    def apply():
+        meetup = client.get(key)
+        if not meetup or meetup.get('status') != 'active':
+            return None, ('MEETUP_NOT_FOUND', 'Meetup not found', 404)
+        if meetup.get('hostId') == user_id:
+            return None, ('HOST_CANNOT_LEAVE', 'Host cannot leave. Cancel the meetup instead.', 400)
+        participants = meetup.get('participants', [])
+        if user_id not in participants:
+            return None, ('NOT_JOINED', 'You are not in this meetup', 400)
+        meetup['participants'] = [uid for uid in participants if uid != user_id]
+        meetup['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
+        client.put(meetup)
+        return meetup, None
+
+    meetup, error = run_in_transaction(apply)
+    if error:
+        return error_response(*error)
+    meetups_changed(meetup, user_id)
 
     return jsonify({
         'success': True,
@@ -207,7 +566,9 @@ def cancel_meetup(meetup_id):
         return error_response('NOT_HOST', 'Only the host can cancel', 403)
 
     meetup['status'] = 'cancelled'
+    meetup['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
     client.put(meetup)
+    meetups_changed(meetup, *meetup.get('participants', []))
 
     return jsonify({
         'success': True,
@@ -218,7 +579,7 @@ def cancel_meetup(meetup_id):
 @meetup_bp.route('/meetups/<meetup_id>/participants', methods=['GET'])
 @require_auth
 def get_meetup_participants(meetup_id):
-    """Get full user profiles for all participants in a meetup."""
+    """Get participant profiles for a meetup, without pictures unless ?include=picture."""
     client = get_client()
     key = client.key('Meetup', meetup_id)
     meetup = client.get(key)
@@ -226,12 +587,24 @@ def get_meetup_participants(meetup_id):
     if not meetup or meetup.get('status') == 'cancelled':
         return error_response('MEETUP_NOT_FOUND', 'Meetup not found', 404)
 
+    include_picture = 'picture' in request.args.get('include', '').split(',')
+
     participant_ids = meetup.get('participants', [])
+    users = {
+        (u.key.name or str(u.key.id)): u
+        for u in client.get_multi([client.key('User', pid) for pid in participant_ids]) if u
+    }
+
     participants = []
     for pid in participant_ids:
-        user = get_user_by_id(pid)
-        if user:
-            participants.append(user_to_dict(user))
+        user = users.get(pid)
+        if not user:
+            continue
+        profile = user_to_dict(user, include_picture=include_picture)
+        if not include_picture:
+            # Pictures are fetched one at a time (and cached) by the client
+            profile['profilePictureUrl'] = picture_url(pid) if user.get('profilePicture') else None
+        participants.append(profile)
 
     return jsonify({
         'success': True,
@@ -239,6 +612,38 @@ def get_meetup_participants(meetup_id):
     })
 
 
+@meetup_bp.route('/meetups/<meetup_id>/best-times', methods=['GET'])
+@require_auth
+def get_meetup_best_times(meetup_id):
+    """Weekly hours when the most participants are free (participants only)."""
+    user_id = request.user_id
+    client = get_client()
+    meetup = client.get(client.key('Meetup', meetup_id))
+
+    if not meetup or meetup.get('status') == 'cancelled':
+        return error_response('MEETUP_NOT_FOUND', 'Meetup not found', 404)
+
+    participant_ids = meetup.get('participants', [])
+    if user_id not in participant_ids:
+        return error_response('NOT_PARTICIPANT', 'You are not in this meetup', 403)
+
+    k = max(1, min(request.args.get('k', BEST_TIMES_DEFAULT, type=int), BEST_TIMES_MAX))
+
+    users = client.get_multi([client.key('User', pid) for pid in participant_ids])
+    masks = {(u.key.name or str(u.key.id)): availability.user_mask(u) for u in users if u}
+
+    slots = availability.best_slots(masks.values(), k)
+    for slot in slots:
+        bit = 1 << (availability.WEEKDAYS.index(slot['day']) * availability.HOURS_PER_DAY + slot['hour'])
+        slot['time'] = f"{slot['hour']}:00"
+        slot['participantIds'] = [pid for pid in participant_ids if masks.get(pid, 0) & bit]
+
+    return jsonify({
+        'success': True,
+        'data': {'participantCount': len(masks), 'bestTimes': slots}
+    })
+
+
 @meetup_bp.route('/meetups/<meetup_id>/messages', methods=['GET'])
 @require_auth
 def get_meetup_messages(meetup_id):
@@ -255,11 +660,27 @@ def get_meetup_messages(meetup_id):
     if user_id not in meetup.get('participants', []):
         return error_response('NOT_PARTICIPANT', 'You are not in this meetup', 403)
 
+    since = request.args.get('since')  # ISO8601 timestamp — only return messages after this
+    cursor = request.args.get('cursor')
+    limit = max(1, min(request.args.get('limit', MESSAGE_PAGE_SIZE, type=int), MESSAGE_PAGE_MAX))
+
+    # With `since`, page forward through new messages; without it, start from
+    # the newest page and let the cursor walk back through history.
     query = client.query(kind='MeetupMessage')
     query.add_filter('meetupId', '=', meetup_id)
+    if since:
+        query.add_filter('createdAt', '>', since)
+        query.order = ['createdAt']
+    else:
+        query.order = ['-createdAt']
+
+    try:
+        entities, next_cursor = fetch_page(query, limit, cursor)
+    except ValueError:
+        return error_response('VALIDATION_ERROR', 'Invalid cursor')
 
     messages = []
-    for entity in query.fetch():
+    for entity in entities:
         messages.append({
             'id': entity.key.name or str(entity.key.id),
             'meetupId': entity.get('meetupId'),
@@ -269,11 +690,12 @@ def get_meetup_messages(meetup_id):
             'createdAt': entity.get('createdAt'),
         })
 
-    messages.sort(key=lambda m: m.get('createdAt', ''))
+    if not since:
+        messages.reverse()
 
     return jsonify({
         'success': True,
-        'data': {'messages': messages}
+        'data': {'messages': messages, 'nextCursor': next_cursor}
     })
 
 
@@ -0,0 +1,440 @@
+"""Resumable, batched data migrations.
+
+A migration pages through every entity of one kind with query cursors and
+transforms each page. A page with changes is written back in a transaction
+that re-reads it by key and transforms the fresh entities again, so writes the
+app made since the query are never overwritten. Up to `parallelism` batches
+are in flight. After every batch whose
+writes (and all earlier ones) have landed, the cursor and counters are
+checkpointed to a MigrationState entity, so an interrupted run resumes from
+the last checkpoint. Transforms must be idempotent: a batch in flight when
+the process died is processed again on resume. Transforms of a batch may
+look entities up by key but must not query, since they run in a transaction.
+
+Run from the server directory:
+    python migrations.py <name> [<name> ...] [--batch-size N] [--parallelism N] [--restart]
+    python migrations.py --status
+"""
+import argparse
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+from db import get_client, Entity, exclude_from_indexes, fetch_page, run_in_transaction
+from models import profile_snapshot, match_partner_id, session_starts_at
+from counters import incoming_poke_counter, POKE_COUNTER_SHARDS
+import availability
+import compaction
+import counters
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_PARALLELISM = 4
+
+MIGRATIONS = {}
+
+
+class Migration:
+    def __init__(self, name, kind, transform_batch, description):
+        self.name = name
+        self.kind = kind
+        self.transform_batch = transform_batch
+        self.description = description
+
+
+def migration(name, kind):
+    """Register fn(entities) -> entities_to_put as a migration over `kind`.
+
+    A migration that needs queries, or writes through its own transactions,
+    instead returns the number of entities it wrote, so the runner can still
+    count them.
+    """
+    def register(fn):
+        MIGRATIONS[name] = Migration(name, kind, fn, (fn.__doc__ or '').strip())
+        return fn
+    return register
+
+
+def per_entity(fn):
+    """Adapt fn(entity) -> bool (True if changed) into a batch transform."""
+    def transform_batch(entities):
+        return [e for e in entities if fn(e)]
+    transform_batch.__doc__ = fn.__doc__
+    return transform_batch
+
+
+# ──────────────────────────────────────────────
+# Checkpoints
+# ──────────────────────────────────────────────
+
+def load_state(name):
+    client = get_client()
+    return client.get(client.key('MigrationState', name))
+
+
+def _save_state(name, **fields):
+    client = get_client()
+    state = Entity(client.key('MigrationState', name), exclude_from_indexes=['cursor'])
+    fields['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
+    state.update(fields)
+    client.put(state)
+
+
+# ──────────────────────────────────────────────
+# Runner
+# ──────────────────────────────────────────────
+
+def _write_batch(transform_batch, keys):
+    """Re-read a page by key, transform it and write the result in one transaction.
+
+    Returns the number of entities written.
+    """
+    client = get_client()
+
+    def apply():
+        fresh = [e for e in client.get_multi(keys) if e]
+        to_put = transform_batch(fresh)
+        if to_put:
+            client.put_multi(to_put)
+        return len(to_put)
+
+    return run_in_transaction(apply)
+
+
+def run_migration(name, batch_size=DEFAULT_BATCH_SIZE, parallelism=DEFAULT_PARALLELISM,
+                  restart=False):
+    """Run (or resume) a registered migration. Returns its final counters."""
+    m = MIGRATIONS[name]
+    client = get_client()
+
+    state = None if restart else load_state(name)
+    if state and state.get('done'):
+        logger.info(f'{name}: already complete ({state.get("processed", 0)} processed)')
+        return dict(state)
+
+    cursor = state.get('cursor') if state else None
+    processed = state.get('processed', 0) if state else 0
+    updated = state.get('updated', 0) if state else 0
+    started_at = time.monotonic()
+    run_processed = 0
+
+    # Batches whose writes are in flight, oldest first: (future, cursor, processed);
+    # each future resolves to the number of entities the batch wrote
+    pending = deque()
+
+    def checkpoint_oldest():
+        nonlocal updated
+        future, batch_cursor, batch_processed = pending.popleft()
+        updated += future.result()  # surface write errors before recording progress
+        _save_state(name, cursor=batch_cursor, processed=batch_processed,
+                    updated=updated, done=False)
+        elapsed = max(time.monotonic() - started_at, 1e-6)
+        logger.info(
+            f'{name}: {batch_processed} processed, {updated} updated '
+            f'({run_processed / elapsed:.1f} entities/s)'
+        )
+
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        while True:
+            query = client.query(kind=m.kind)
+            entities, next_cursor = fetch_page(query, batch_size, cursor)
+            if not entities:
+                break
+
+            # A first pass over the query results finds pages with nothing to do
+            to_put = m.transform_batch(entities)
+            processed += len(entities)
+            run_processed += len(entities)
+
+            if isinstance(to_put, int) or not to_put:
+                future = Future()
+                future.set_result(to_put or 0)
+            else:
+                future = pool.submit(_write_batch, m.transform_batch, [e.key for e in entities])
+            pending.append((future, next_cursor, processed))
+
+            while pending and (len(pending) >= parallelism or pending[0][0].done()):
+                checkpoint_oldest()
+
+            if not next_cursor:
+                break
+            cursor = next_cursor
+
+        while pending:
+            checkpoint_oldest()
+
+    elapsed = time.monotonic() - started_at
+    _save_state(name, cursor=None, processed=processed, updated=updated, done=True,
+                seconds=round(elapsed, 2))
+    logger.info(
+        f'{name}: done — {processed} processed, {updated} updated in {elapsed:.1f}s '
+        f'({run_processed / max(elapsed, 1e-6):.1f} entities/s)'
+    )
+    return {'processed': processed, 'updated': updated, 'seconds': elapsed, 'done': True}
+
+
+# ──────────────────────────────────────────────
+# Migrations
+# ──────────────────────────────────────────────
+
+def _set_user_ids(*fields):
+    def transform(entity):
+        if entity.get('userIds'):
+            return False
+        entity['userIds'] = [entity.get(f) for f in fields if entity.get(f)]
+        return True
+    return transform
+
+
+migration('match_user_ids', 'Match')(per_entity(_set_user_ids('user1Id', 'user2Id')))
+migration('session_user_ids', 'Session')(per_entity(_set_user_ids('proposerId', 'responderId')))
+
+
+@migration('match_last_activity', 'Match')
+def backfill_match_activity(matches):
+    """Create MatchActivity summaries for matches that predate them."""
+    from match import record_last_message
+
+    client = get_client()
+    keys = [client.key('MatchActivity', m.key.name or str(m.key.id)) for m in matches]
+    existing = {a.key.name for a in client.get_multi(keys) if a}
+
+    written = 0
+    for match in matches:
+        match_id = match.key.name or str(match.key.id)
+        if match_id in existing:
+            continue
+        if match.get('lastMessageCreatedAt'):
+            text = match.get('lastMessageText')
+            sender_id = match.get('lastMessageSenderId')
+            created_at = match.get('lastMessageCreatedAt')
+        else:
+            q = client.query(kind='Message')
+            q.add_filter('matchId', '=', match_id)
+            q.order = ['-createdAt']
+            newest = list(q.fetch(limit=1))
+            if not newest:
+                continue
+            text = newest[0].get('text')
+            sender_id = newest[0].get('senderId')
+            created_at = newest[0].get('createdAt')
+        # Monotonic transactional write, so live chat traffic always wins
+        record_last_message(match_id, text, sender_id, created_at)
+        written += 1
+    return written
+
+
+@migration('match_profile_snapshots', 'Match')
+def backfill_profile_snapshots(matches):
+    """Store partner profile snapshots on matches created before snapshots existed."""
+    client = get_client()
+    needed = set()
+    for match in matches:
+        profiles = match.get('profiles') or {}
+        needed.update(uid for uid in (match.get('user1Id'), match.get('user2Id'))
+                      if uid and uid not in profiles)
+    if not needed:
+        return []
+
+    users = {
+        u.key.name or str(u.key.id): u
+        for u in client.get_multi([client.key('User', uid) for uid in needed]) if u
+    }
+    changed = []
+    for match in matches:
+        profiles = dict(match.get('profiles') or {})
+        missing = [uid for uid in (match.get('user1Id'), match.get('user2Id'))
+                   if uid and uid not in profiles and uid in users]
+        if missing:
+            for uid in missing:
+                profiles[uid] = profile_snapshot(users[uid])
+            match['profiles'] = profiles
+            exclude_from_indexes(match, 'profiles')
+            changed.append(match)
+    return changed
+
+
+@migration('message_reaction_aggregates', 'MessageReaction')
+def backfill_reaction_aggregates(reactions):
+    """Fold legacy MessageReaction rows into the reactions map on their Message, then delete them."""
+    from match import _add_reaction
+
+    def fold(target, rows):
+        for r in rows:
+            _add_reaction(target, r.get('userId'), r.get('emoji'), r.get('createdAt'))
+
+    client = get_client()
+    by_message = {}
+    for r in reactions:
+        by_message.setdefault(r.get('messageId'), []).append(r)
+
+    written = 0
+    for message_id, rows in by_message.items():
+        keys = [r.key for r in rows]
+
+        # Fold and delete in one transaction, so a row is never counted twice
+        # and one the user removed meanwhile doesn't come back
+        def apply(message_id=message_id, keys=keys):
+            fresh = [r for r in client.get_multi(keys) if r]
+            message = client.get(client.key('Message', message_id)) if message_id else None
+            if not fresh or not message:
+                return fresh, False
+            fold(message, fresh)
+            exclude_from_indexes(message, 'reactions')
+            client.put(message)
+            client.delete_multi([r.key for r in fresh])
+            return fresh, True
+
+        fresh, folded = run_in_transaction(apply)
+        if fresh and not folded:
+            # Compacted into a MessageBlock, or the message is gone
+            block_key = compaction.find_compacted_block(fresh[0].get('matchId'), message_id)
+            if block_key is not None:
+                compaction.update_compacted_message(block_key, message_id, lambda item: fold(item, fresh))
+            client.delete_multi([r.key for r in fresh])
+        written += len(fresh)
+    return written
+
+
+@migration('poke_status', 'Poke')
+def backfill_poke_status(pokes):
+    """Mark legacy pokes 'pending', or 'matched' once the pair has an active match."""
+    pokes = [p for p in pokes if not p.get('status')]
+    if not pokes:
+        return 0
+    client = get_client()
+    partners = {}
+    for uid in {p.get('toUserId') for p in pokes}:
+        q = client.query(kind='Match')
+        q.add_filter('userIds', '=', uid)
+        q.add_filter('status', '=', 'active')
+        partners[uid] = {match_partner_id(m, uid) for m in q.fetch()}
+
+    # The match lookups are queries, so the batch writes in its own
+    # transaction, skipping pokes the app has given a status meanwhile
+    def apply():
+        fresh = [p for p in client.get_multi([p.key for p in pokes]) if p and not p.get('status')]
+        for p in fresh:
+            matched = p.get('fromUserId') in partners.get(p.get('toUserId'), ())
+            p['status'] = 'matched' if matched else 'pending'
+        client.put_multi(fresh)
+        return len(fresh)
+
+    return run_in_transaction(apply)
+
+
+@migration('incoming_poke_counts', 'User')
+def recount_incoming_pokes(users):
+    """Recompute each user's pending-poke badge counter (run after poke_status)."""
+
+    client = get_client()
+    for user in users:
+        user_id = user.key.name or str(user.key.id)
+        q = client.query(kind='Poke')
+        q.add_filter('toUserId', '=', user_id)
+        q.add_filter('status', '=', 'pending')
+        q.keys_only()
+        counters.set_count(incoming_poke_counter(user_id), len(list(q.fetch())),
+                           shards=POKE_COUNTER_SHARDS)
+    return len(users)
+
+
+@migration('meetup_sport_key', 'Meetup')
+@per_entity
+def set_meetup_sport_key(meetup):
+    """Store the case-folded sportKey that meetup listings filter on."""
+    from meetup import sport_key
+
+    key = sport_key(meetup.get('sport'))
+    if meetup.get('sportKey') == key:
+        return False
+    meetup['sportKey'] = key
+    return True
+
+
+@migration('session_starts_at', 'Session')
+@per_entity
+def set_session_starts_at(session):
+    """Store the sortable UTC start time upcoming-session queries range over."""
+    if session.get('startsAt'):
+        return False
+    starts_at = session_starts_at(session.get('date'), session.get('startHour'),
+                                  session.get('day'), session.get('createdAt'))
+    if not starts_at:
+        return False
+    session['startsAt'] = starts_at
+    return True
+
+
+@migration('user_availability_mask', 'User')
+@per_entity
+def set_availability_mask(user):
+    """Cache the compiled 168-bit weekly availability mask on each profile."""
+    mask = availability.to_hex(availability.compile_mask(user.get('availability') or {}))
+    if user.get('availabilityMask') == mask:
+        return False
+    user['availabilityMask'] = mask
+    exclude_from_indexes(user, 'availabilityMask')
+    return True
+
+
+@migration('match_active_session', 'Match')
+def backfill_active_session(matches):
+    """Give each match an ActiveSession pointer at its newest pending/accepted session."""
+    from match import legacy_active_sessions
+
+    client = get_client()
+    written = 0
+    for match_ref in matches:
+        match_id = match_ref.key.name or str(match_ref.key.id)
+        pointer_key = client.key('ActiveSession', match_id)
+        if client.get(pointer_key) is not None:
+            continue
+        sessions = legacy_active_sessions(client, match_id)
+        session_id = sessions[-1].key.name if sessions else None
+
+        # Transactional, so a pointer written by a proposal mid-migration wins
+        def apply(pointer_key=pointer_key, match_id=match_id, session_id=session_id):
+            if client.get(pointer_key) is not None:
+                return False
+            pointer = Entity(pointer_key)
+            pointer.update({
+                'matchId': match_id,
+                'sessionId': session_id,
+                'updatedAt': datetime.utcnow().isoformat() + 'Z',
+            })
+            client.put(pointer)
+            return True
+
+        written += run_in_transaction(apply)
+    return written
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Run resumable data migrations')
+    parser.add_argument('names', nargs='*', help=f'one or more of: {", ".join(sorted(MIGRATIONS))}')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--parallelism', type=int, default=DEFAULT_PARALLELISM)
+    parser.add_argument('--restart', action='store_true', help='Ignore any saved checkpoint')
+    parser.add_argument('--status', action='store_true', help='Show progress of every migration')
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in MIGRATIONS:
+            parser.error(f'unknown migration: {name}')
+
+    if args.status or not args.names:
+        for name, m in sorted(MIGRATIONS.items()):
+            state = load_state(name)
+            progress = 'not started'
+            if state:
+                progress = ('done' if state.get('done') else 'in progress') + \
+                    f', {state.get("processed", 0)} processed, {state.get("updated", 0)} updated'
+            print(f'{name:30} {m.kind:16} {progress}')
+    else:
+        for name in args.names:
+            run_migration(name, batch_size=args.batch_size, parallelism=args.parallelism,
+                          restart=args.restart)
@@ -1,4 +1,5 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+import pytz
 from config import Config
 
 # Hour ranges for availability shortcuts
@@ -34,6 +35,70 @@ def expand_availability(availability):
     return expanded
 
 
+# Public profile fields copied onto each Match so match lists need no User reads
+SNAPSHOT_FIELDS = ('displayName', 'sports', 'collegeYear', 'bio', 'major', 'availability', 'socials')
+
+
+def profile_snapshot(user):
+    """Compact copy of a user's profile (no picture), versioned by its updatedAt."""
+    snapshot = {field: user.get(field) for field in SNAPSHOT_FIELDS}
+    snapshot['updatedAt'] = user.get('updatedAt') or user.get('createdAt') or ''
+    return snapshot
+
+
+def match_partner_id(match, user_id):
+    """The other participant of a Match entity."""
+    return match.get('user2Id') if match.get('user1Id') == user_id else match.get('user1Id')
+
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def session_starts_at(date, start_hour, day=None, reference=None):
+    """UTC start of a session as a sortable ISO string, or None.
+
+    `date` + `startHour` are wall-clock time in Config.TIMEZONE. Sessions
+    proposed without a date fall on the next `day` (weekday name) on or
+    after `reference` (an ISO timestamp, default now).
+    """
+    if start_hour is None:
+        return None
+    tz = pytz.timezone(Config.TIMEZONE)
+    try:
+        local_date = datetime.strptime(date, '%Y-%m-%d').date() if date else None
+    except (ValueError, TypeError):
+        local_date = None
+    if local_date is None:
+        if day not in WEEKDAYS:
+            return None
+        ref = datetime.utcnow()
+        if reference:
+            ref = datetime.fromisoformat(reference.rstrip('Z')[:26])
+        ref_local = pytz.utc.localize(ref).astimezone(tz).date()
+        local_date = ref_local + timedelta(days=(WEEKDAYS.index(day) - ref_local.weekday()) % 7)
+    try:
+        local = tz.localize(datetime(local_date.year, local_date.month, local_date.day, int(start_hour)))
+    except (ValueError, TypeError):
+        return None
+    return local.astimezone(pytz.utc).replace(tzinfo=None).isoformat() + 'Z'
+
+
+def utc_timestamp(value):
+    """Normalize an ISO 8601 date or date-time to the UTC form startsAt uses.
+
+    Offsets are converted to UTC and naive values are taken as UTC, e.g.
+    "2026-03-06T09:00:00-08:00" -> "2026-03-06T17:00:00Z". Raises ValueError
+    for anything else.
+    """
+    text = str(value).strip()
+    if text.endswith(('Z', 'z')):
+        text = text[:-1] + '+00:00'
+    moment = datetime.fromisoformat(text)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(pytz.utc).replace(tzinfo=None)
+    return moment.isoformat(timespec='seconds') + 'Z'
+
+
 def session_to_dict(entity):
     """Convert a Datastore Session entity to a dictionary."""
     if entity is None:
@@ -48,6 +113,7 @@ def session_to_dict(entity):
         'date': entity.get('date', ''),
         'startHour': entity.get('startHour'),
         'endHour': entity.get('endHour'),
+        'startsAt': entity.get('startsAt'),
         'location': entity.get('location'),
         'status': entity.get('status'),
         'isChangeProposal': entity.get('isChangeProposal', False),
@@ -70,11 +136,15 @@ def meetup_to_dict(entity):
         'date': entity.get('date') or '',
         'time': entity.get('time') or '',
         'location': entity.get('location'),
+        'lat': entity.get('lat'),
+        'lng': entity.get('lng'),
         'skillLevels': entity.get('skillLevels') or [],
         'playerLimit': entity.get('playerLimit'),
+        'joinMode': entity.get('joinMode') or 'direct',
         'participants': entity.get('participants') or [],
         'status': entity.get('status') or 'active',
         'createdAt': entity.get('createdAt') or '',
+        'updatedAt': entity.get('updatedAt') or entity.get('createdAt') or '',
     }
 
 
@@ -104,3 +174,14 @@ def user_to_dict(entity, include_password=False, include_picture=True):
         result['passwordHash'] = entity.get('passwordHash')
 
     return result
+
+
+def reactions_to_list(aggregate):
+    """Flatten a Message `reactions` aggregate ({emoji: {userId: createdAt}})
+    into the API's list of reaction objects, oldest first."""
+    reactions = []
+    for emoji, users in (aggregate or {}).items():
+        for uid, created_at in (users or {}).items():
+            reactions.append({'emoji': emoji, 'userId': uid, 'createdAt': created_at})
+    reactions.sort(key=lambda r: r.get('createdAt') or '')
+    return reactions
@@ -0,0 +1,20 @@
+"""Fire-and-forget background work that should not hold up a response."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='pokeme-task')
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.warning(f'Background task failed: {type(error).__name__}: {error}')
+
+
+def defer(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) on the background pool and return its Future."""
+    future = _executor.submit(fn, *args, **kwargs)
+    future.add_done_callback(_log_failure)
+    return future
@@ -1,3 +1,4 @@
+import copy
 import pytest
 import sys
 import os
@@ -31,3 +32,135 @@ def mock_db():
     """Mock the datastore client."""
     with patch('db.client') as mock:
         yield mock
+
+
+class FakeKey:
+    """Stand-in for a Datastore key with a string name."""
+
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        self.id = None
+
+
+class FakeEntity(dict):
+    """Stand-in for datastore.Entity; drop-in for db.Entity in patches."""
+
+    def __init__(self, key, exclude_from_indexes=None):
+        super().__init__()
+        self.key = key
+        self.exclude_from_indexes = set(exclude_from_indexes or [])
+
+
+def _copy(entity):
+    copied = FakeEntity(entity.key, entity.exclude_from_indexes)
+    copied.update(copy.deepcopy(dict(entity)))
+    return copied
+
+
+def _matches(have, op, value):
+    if op == '=':
+        # Equality on a list property matches any element, as in Datastore
+        return value in have if isinstance(have, list) else have == value
+    if op == 'IN':
+        return have in value
+    if have is None:
+        return False
+    return {
+        '<': have < value,
+        '<=': have <= value,
+        '>': have > value,
+        '>=': have >= value,
+    }[op]
+
+
+class FakeQuery:
+    """Filters, orders and limits over the FakeClient's store."""
+
+    def __init__(self, store, kind):
+        self.store = store
+        self.kind = kind
+        self.filters = []
+        self.order = []
+
+    def add_filter(self, name, op, value):
+        self.filters.append((name, op, value))
+
+    def keys_only(self):
+        pass
+
+    def results(self):
+        rows = [e for (kind, _), e in sorted(self.store.items(), key=lambda item: item[0])
+                if kind == self.kind and all(_matches(e.get(n), op, v) for n, op, v in self.filters)]
+        for prop in reversed(self.order):
+            name = prop.lstrip('-')
+            rows.sort(key=lambda e: (e.get(name) is None, e.get(name)), reverse=prop.startswith('-'))
+        # Each result is a fresh copy, as from Datastore; changes need a put
+        return [_copy(e) for e in rows]
+
+    def fetch(self, limit=None):
+        rows = self.results()
+        return iter(rows[:limit] if limit is not None else rows)
+
+
+class FakeClient:
+    """In-memory Datastore client keyed by (kind, name).
+
+    Records every query in `queries` and counts batched reads, so tests can
+    check how much Datastore work a request does.
+    """
+
+    Entity = FakeEntity
+
+    def __init__(self):
+        self.store = {}
+        self.queries = []
+        self.get_multi_calls = 0
+
+    def key(self, kind, name):
+        return FakeKey(kind, name)
+
+    def get(self, key):
+        return self.store.get((key.kind, key.name))
+
+    def get_multi(self, keys):
+        self.get_multi_calls += 1
+        return [self.store[(k.kind, k.name)] for k in keys if (k.kind, k.name) in self.store]
+
+    def put(self, entity):
+        self.store[(entity.key.kind, entity.key.name)] = entity
+
+    def put_multi(self, entities):
+        for e in entities:
+            self.put(e)
+
+    def delete(self, key):
+        self.store.pop((key.kind, key.name), None)
+
+    def delete_multi(self, keys):
+        for k in keys:
+            self.delete(k)
+
+    def query(self, kind):
+        query = FakeQuery(self.store, kind)
+        self.queries.append(query)
+        return query
+
+    def add(self, kind, name, /, **props):
+        entity = FakeEntity(FakeKey(kind, name))
+        entity.update(props)
+        self.put(entity)
+        return entity
+
+    def fetch_page(self, query, limit, cursor=None):
+        """Drop-in for db.fetch_page; the cursor is simply the next offset."""
+        rows = query.results()
+        start = int(cursor or 0)
+        more = start + limit < len(rows)
+        return rows[start:start + limit], str(start + limit) if more else None
+
+
+@pytest.fixture
+def datastore():
+    """An empty in-memory Datastore; patch it in as the module's get_client()."""
+    return FakeClient()
@@ -0,0 +1,73 @@
+from datetime import date
+
+import availability
+from models import expand_availability
+
+
+def test_mask_round_trips_and_matches_set_intersection():
+    mine = {'Monday': ['Morning', '14:00'], 'Saturday': ['Afternoon'], 'Funday': ['10:00']}
+    theirs = {'Monday': ['10:00', '14:00', '20:00'], 'Saturday': ['Evening', '12:00']}
+
+    mask = availability.compile_mask(mine)
+    assert availability.from_hex(availability.to_hex(mask)) == mask
+    assert len(availability.to_hex(mask)) == 42
+
+    shared = availability.weekly_hours(mask & availability.compile_mask(theirs))
+    expected = {}
+    a, b = expand_availability(mine), expand_availability(theirs)
+    for day in set(a) & set(b):
+        if a[day] & b[day]:
+            expected[day] = sorted(a[day] & b[day])
+    expected.pop('Funday', None)
+    assert shared == expected == {'Monday': [10, 14], 'Saturday': [12]}
+
+
+def test_user_mask_prefers_the_cached_hex():
+    cached = availability.to_hex(availability.compile_mask({'Sunday': ['09:00']}))
+    user = {'availability': {'Monday': ['09:00']}, 'availabilityMask': cached}
+    assert availability.weekly_hours(availability.user_mask(user)) == {'Sunday': [9]}
+    assert availability.weekly_hours(availability.user_mask({'availability': {}})) == {}
+
+
+def test_open_slots_expand_dates_and_skip_booked_hours():
+    mask = availability.compile_mask({'Monday': ['17:00', '18:00'], 'Wednesday': ['09:00']})
+    # 2026-03-02 is a Monday
+    slots = availability.open_slots(mask, date(2026, 3, 2), 10, booked={('2026-03-02', 17), ('2026-03-04', 9)})
+
+    assert slots == [
+        {'date': '2026-03-02', 'day': 'Monday', 'hours': [18]},
+        {'date': '2026-03-09', 'day': 'Monday', 'hours': [17, 18]},
+        {'date': '2026-03-11', 'day': 'Wednesday', 'hours': [9]},
+    ]
+
+
+def test_booked_hours_are_local_to_the_session():
+    from match import booked_hours
+
+    # 6pm-8pm Pacific on July 4th starts at 01:00 UTC on the 5th
+    sessions = [{'startsAt': '2026-07-05T01:00:00Z', 'startHour': 18, 'endHour': 20}, {'startHour': 9}]
+    assert booked_hours(sessions) == {('2026-07-04', 18), ('2026-07-04', 19)}
+
+
+def test_bit_sliced_counts_match_naive_counting():
+    import random
+    rng = random.Random(7)
+    masks = [rng.getrandbits(availability.HOURS_PER_WEEK) for _ in range(37)]
+
+    counts = availability.hour_counts(availability.count_planes(masks))
+
+    assert counts == [sum(m >> h & 1 for m in masks) for h in range(availability.HOURS_PER_WEEK)]
+
+
+def test_best_slots_rank_by_coverage_then_time():
+    masks = [
+        availability.compile_mask({'Tuesday': ['18:00', '19:00'], 'Monday': ['09:00']}),
+        availability.compile_mask({'Tuesday': ['18:00'], 'Monday': ['09:00']}),
+        availability.compile_mask({'Tuesday': ['18:00', '19:00']}),
+    ]
+    assert availability.best_slots(masks, 3) == [
+        {'day': 'Tuesday', 'hour': 18, 'count': 3},
+        {'day': 'Monday', 'hour': 9, 'count': 2},
+        {'day': 'Tuesday', 'hour': 19, 'count': 2},
+    ]
+    assert availability.best_slots([], 3) == []
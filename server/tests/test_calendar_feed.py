@@ -0,0 +1,129 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+import calendar_feed
+from auth import generate_token
+
+
+@pytest.fixture
+def fake(datastore):
+    datastore.add('User', 'amy', calendarToken='tok')
+    datastore.add('Version', 'calendar:amy', token='v1', updatedAt='2026-03-01T12:00:00.123456Z')
+    with patch('calendar_feed.get_client', return_value=datastore), \
+            patch('versions.get_client', return_value=datastore):
+        yield datastore
+
+
+def test_fold_line_splits_at_75_octets():
+    folded = calendar_feed.fold_line('DESCRIPTION:' + 'x' * 150)
+    lines = folded[:-2].split('\r\n')
+    assert folded.endswith('\r\n')
+    assert [len(line.encode('utf-8')) for line in lines] == [75, 75, 14]
+    assert all(line.startswith(' ') for line in lines[1:])
+
+
+def test_fold_line_keeps_multibyte_characters_whole():
+    folded = calendar_feed.fold_line('SUMMARY:' + 'é' * 60)
+    for line in folded[:-2].split('\r\n'):
+        assert len(line.encode('utf-8')) <= 75
+    assert folded.replace('\r\n ', '') == 'SUMMARY:' + 'é' * 60 + '\r\n'
+
+
+def test_escape_text():
+    assert calendar_feed.escape_text('a,b;c\\d\ne') == 'a\\,b\\;c\\\\d\\ne'
+
+
+def test_feed_streams_sessions_and_meetups(client, fake):
+    fake.add('Session', 's1', userIds=['amy', 'bob'], status='accepted', sport='Tennis',
+             startHour=9, endHour=11, startsAt='2026-03-06T17:00:00Z', location='Court 3')
+    fake.add('Session', 's2', userIds=['amy', 'bob'], status='pending', startsAt='2026-03-06T18:00:00Z')
+    fake.add('Meetup', 'mu1', participants=['amy'], status='active', title='Pickup, soccer',
+             sport='Soccer', date='2026-03-07', time='10:00')
+
+    with patch('calendar_feed.datetime') as dt:
+        dt.utcnow.return_value = datetime(2026, 3, 5)
+        dt.fromisoformat = datetime.fromisoformat
+        dt.strptime = datetime.strptime
+        response = client.get('/api/calendar/tok.ics')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/calendar'
+    assert response.is_streamed
+    body = response.get_data(as_text=True)
+    assert body.startswith('BEGIN:VCALENDAR\r\n')
+    assert body.endswith('END:VCALENDAR\r\n')
+    assert 'UID:session-s1@pokeme\r\n' in body
+    assert 'DTSTART:20260306T170000Z\r\nDTEND:20260306T190000Z\r\n' in body
+    assert 'SUMMARY:Pickup\\, soccer\r\n' in body
+    assert response.headers['Last-Modified'] == 'Sun, 01 Mar 2026 12:00:00 GMT'
+    assert 'session-s2' not in body
+
+
+def test_unchanged_feed_is_not_modified(client, fake):
+    etag = client.get('/api/calendar/tok.ics').headers['ETag'].strip('"')
+    reads = len(fake.queries)
+
+    response = client.get('/api/calendar/tok.ics', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 304
+    # Only the token lookup; no session or meetup queries
+    assert len(fake.queries) == reads + 1
+
+    response = client.get('/api/calendar/tok.ics',
+                          headers={'If-Modified-Since': 'Sun, 01 Mar 2026 12:00:00 GMT'})
+    assert response.status_code == 304
+
+    fake.add('Version', 'calendar:amy', token='v2', updatedAt='2026-03-02T08:00:00Z')
+    response = client.get('/api/calendar/tok.ics', headers={'If-None-Match': f'"{etag}"'})
+    assert response.status_code == 200
+
+
+def test_unknown_token_is_not_found(client, fake):
+    assert client.get('/api/calendar/nope.ics').status_code == 404
+
+
+def test_deleting_an_account_bumps_partner_and_meetup_calendars(client, fake):
+    fake.add('Match', 'amy_bob', userIds=['amy', 'bob'], user1Id='amy', user2Id='bob')
+    fake.add('Session', 's1', matchId='amy_bob', userIds=['amy', 'bob'], status='accepted')
+    fake.add('Meetup', 'joined', hostId='carl', participants=['carl', 'amy'], status='active')
+    fake.add('Meetup', 'hosted', hostId='amy', participants=['amy', 'dan'], status='active')
+    fake.add('MeetupJoinRequest', 'later_amy', meetupId='later', userId='amy', status='pending')
+
+    headers = {'Authorization': f'Bearer {generate_token("amy")}'}
+    with patch('auth.get_client', return_value=fake), \
+            patch('counters.get_client', return_value=fake), \
+            patch('auth.versions.bump') as bump:
+        assert client.delete('/api/auth/account', headers=headers).status_code == 200
+
+    assert {'calendar:bob', 'calendar:carl', 'calendar:dan'} <= set(bump.call_args.args)
+    assert fake.store[('Meetup', 'joined')]['participants'] == ['carl']
+    assert fake.store[('Meetup', 'hosted')]['status'] == 'cancelled'
+    assert ('Session', 's1') not in fake.store
+    assert ('MeetupJoinRequest', 'later_amy') not in fake.store
+
+
+def test_first_feed_url_keeps_a_token_written_concurrently(client, fake):
+    fake.add('User', 'cy', displayName='Cy')
+    headers = {'Authorization': f'Bearer {generate_token("cy")}'}
+    stale = dict(fake.store[('User', 'cy')])
+    # Another request stores a token after this one read the user
+    fake.store[('User', 'cy')]['calendarToken'] = 'first'
+
+    with patch('auth.get_client', return_value=fake), \
+            patch('auth.get_user_by_id', return_value=stale):
+        url = client.get('/api/auth/calendar', headers=headers).get_json()['data']['url']
+
+    assert url == '/api/calendar/first.ics'
+    assert fake.store[('User', 'cy')]['calendarToken'] == 'first'
+
+
+def test_rotating_replaces_the_token(client, fake):
+    headers = {'Authorization': f'Bearer {generate_token("amy")}'}
+    with patch('auth.get_client', return_value=fake), \
+            patch('auth.versions.bump') as bump:
+        url = client.post('/api/auth/calendar/rotate', headers=headers).get_json()['data']['url']
+
+    assert url == f'/api/calendar/{fake.store[("User", "amy")]["calendarToken"]}.ics'
+    assert url != '/api/calendar/tok.ics'
+    bump.assert_called_once_with('calendar:amy')
@@ -0,0 +1,129 @@
+import json
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+import compaction
+from auth import generate_token
+from compaction import compaction_cutoff, compact_match, pack_message, unpack_block
+
+CUTOFF = '2026-02-01T00:00:00Z'
+
+
+@pytest.fixture
+def fake(datastore):
+    datastore.add('Match', 'm1', user1Id='amy', user2Id='bob', userIds=['amy', 'bob'])
+    for i, created_at in enumerate(['2026-01-05T10:00:00Z', '2026-01-06T10:00:00Z',
+                                    '2026-01-07T10:00:00Z', '2026-02-10T10:00:00Z']):
+        datastore.add('Message', f'msg{i}', matchId='m1', senderId='amy', text=str(i),
+                      createdAt=created_at)
+    with patch('compaction.get_client', return_value=datastore), \
+            patch('compaction.Entity', datastore.Entity), \
+            patch('match.get_client', return_value=datastore), \
+            patch('match.versions.get_stamps', return_value=['v1']), \
+            patch('match.versions.bump'):
+        yield datastore
+
+
+def history(client):
+    headers = {'Authorization': f'Bearer {generate_token("bob")}'}
+    return client.get('/api/matches/m1/messages', headers=headers).get_json()['data']['messages']
+
+
+def test_compaction_cutoff_only_covers_fully_cold_months():
+    # 30 days before March 10 is February 8, so only January and earlier are cold
+    assert compaction_cutoff(now=datetime(2026, 3, 10), days=30) == '2026-02-01T00:00:00Z'
+
+
+def test_pack_message_drops_empty_fields_and_round_trips(datastore):
+    msg = {
+        'matchId': 'm1',
+        'senderId': 'u1',
+        'text': 'see you at the ARC',
+        'createdAt': '2026-01-05T18:00:00Z',
+        'type': None,
+        'metadata': None,
+        'reactions': {'👍': {'u2': '2026-01-05T18:01:00Z'}},
+    }
+
+    packed = pack_message('msg-1', msg)
+    assert packed == {
+        'id': 'msg-1',
+        'senderId': 'u1',
+        'text': 'see you at the ARC',
+        'createdAt': '2026-01-05T18:00:00Z',
+        'reactions': {'👍': {'u2': '2026-01-05T18:01:00Z'}},
+    }
+
+    block = datastore.add('MessageBlock', 'm1_2026-01_0', payload=json.dumps([packed]))
+    assert unpack_block(block) == [packed]
+
+
+def test_compact_match_moves_cold_messages_into_blocks(fake):
+    with patch('compaction.BLOCK_MAX_MESSAGES', 2):
+        assert compact_match('m1', CUTOFF) == 3
+
+    assert fake.store[('Match', 'm1')]['compactedThrough'] == CUTOFF
+    assert [k for k in fake.store if k[0] == 'Message'] == [('Message', 'msg3')]
+    blocks = [fake.store[('MessageBlock', f'm1_2026-01_{i}')] for i in range(2)]
+    assert [b['messageIds'] for b in blocks] == [['msg0', 'msg1'], ['msg2']]
+    # Nothing left to compact on a rerun
+    assert compact_match('m1', CUTOFF) == 0
+
+
+def test_history_reads_blocks_and_live_messages(client, fake):
+    compact_match('m1', CUTOFF)
+
+    assert [m['id'] for m in history(client)] == ['msg0', 'msg1', 'msg2', 'msg3']
+
+
+def test_crash_after_a_block_keeps_history_readable(client, fake):
+    real_block = compaction._block_entity
+    calls = []
+
+    def crash_on_second_block(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise RuntimeError('process died')
+        return real_block(*args)
+
+    with patch('compaction.BLOCK_MAX_MESSAGES', 1), \
+            patch('compaction._block_entity', crash_on_second_block), \
+            pytest.raises(RuntimeError):
+        compact_match('m1', CUTOFF)
+
+    # The mark went down before the first block, so that block is already read
+    assert fake.store[('Match', 'm1')]['compactedThrough'] == CUTOFF
+    assert [m['id'] for m in history(client)] == ['msg0', 'msg1', 'msg2', 'msg3']
+
+    assert compact_match('m1', CUTOFF) == 2
+    assert [m['id'] for m in history(client)] == ['msg0', 'msg1', 'msg2', 'msg3']
+
+
+def test_blocks_pack_messages_as_read_in_the_transaction(fake):
+    real_transaction = compaction.run_in_transaction
+
+    def react_first(fn):
+        # A reaction commits between the query and the block write
+        fake.store[('Message', 'msg0')]['reactions'] = {'🔥': {'bob': '2026-03-01T00:00:00Z'}}
+        return real_transaction(fn)
+
+    with patch('compaction.run_in_transaction', react_first):
+        compact_match('m1', CUTOFF)
+
+    packed = unpack_block(fake.store[('MessageBlock', 'm1_2026-01_0')])
+    assert packed[0]['reactions'] == {'🔥': {'bob': '2026-03-01T00:00:00Z'}}
+
+
+def test_reacting_to_a_compacted_message(client, fake):
+    compact_match('m1', CUTOFF)
+    headers = {'Authorization': f'Bearer {generate_token("bob")}'}
+
+    response = client.post('/api/matches/m1/messages/msg1/reactions', json={'emoji': '👍'}, headers=headers)
+
+    assert response.status_code == 200
+    packed = unpack_block(fake.store[('MessageBlock', 'm1_2026-01_0')])
+    assert set(packed[1]['reactions']['👍']) == {'bob'}
+    reactions = next(m for m in history(client) if m['id'] == 'msg1')['reactions']
+    assert [(r['userId'], r['emoji']) for r in reactions] == [('bob', '👍')]
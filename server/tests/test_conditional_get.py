@@ -0,0 +1,114 @@
+from unittest.mock import patch
+
+import pytest
+
+from auth import generate_token
+
+
+def test_me_answers_304_until_profile_changes(client, datastore):
+    user = datastore.add(
+        'User', 'u1',
+        displayName='Sam',
+        createdAt='2026-01-01T00:00:00Z',
+        updatedAt='2026-03-01T00:00:00Z',
+    )
+    headers = {'Authorization': f'Bearer {generate_token("u1")}'}
+
+    with patch('auth.get_user_by_id', return_value=user):
+        first = client.get('/api/auth/me', headers=headers)
+        etag = first.headers['ETag'].strip('"')
+
+        unchanged = client.get('/api/auth/me', headers={**headers, 'If-None-Match': f'"{etag}"'})
+
+        user['updatedAt'] = '2026-03-02T00:00:00Z'
+        changed = client.get('/api/auth/me', headers={**headers, 'If-None-Match': f'"{etag}"'})
+
+    assert first.status_code == 200
+    assert unchanged.status_code == 304
+    assert unchanged.data == b''
+    assert changed.status_code == 200
+    assert changed.headers['ETag'].strip('"') != etag
+
+
+@pytest.fixture
+def fake(datastore):
+    for user_id, name in [('amy', 'Amy'), ('bob', 'Bob'), ('cy', 'Cy')]:
+        datastore.add('User', user_id, displayName=name, updatedAt='2026-01-01T00:00:00Z')
+    datastore.add('Match', 'amy_bob', user1Id='amy', user2Id='bob', userIds=['amy', 'bob'],
+                  status='active', profiles={}, createdAt='2026-01-01T00:00:00Z')
+    datastore.add('Message', 'msg0', matchId='amy_bob', senderId='bob', text='hi',
+                  createdAt='2026-03-01T10:00:00Z')
+    with patch('match.get_client', return_value=datastore), \
+            patch('match.Entity', datastore.Entity), \
+            patch('match.fetch_page', datastore.fetch_page), \
+            patch('versions.get_client', return_value=datastore), \
+            patch('versions.Entity', datastore.Entity), \
+            patch('match.counters.get_counts', side_effect=lambda names: dict.fromkeys(names, 0)), \
+            patch('match.counters.increment'), \
+            patch('match.counters.reset'):
+        yield datastore
+
+
+def auth(user_id):
+    return {'Authorization': f'Bearer {generate_token(user_id)}'}
+
+
+def revalidate(client, fake, url, etag):
+    """GET with If-None-Match; returns (response, queries it ran)."""
+    before = len(fake.queries)
+    response = client.get(url, headers={**auth('amy'), 'If-None-Match': f'"{etag}"'})
+    return response, len(fake.queries) - before
+
+
+def etag_of(response):
+    return response.headers['ETag'].strip('"')
+
+
+def test_match_list_is_not_modified_until_a_message_is_sent(client, fake):
+    etag = etag_of(client.get('/api/matches', headers=auth('amy')))
+
+    response, queries = revalidate(client, fake, '/api/matches', etag)
+    assert response.status_code == 304
+    assert queries == 0
+
+    client.post('/api/matches/amy_bob/messages', json={'text': 'yo'}, headers=auth('bob'))
+    response, _ = revalidate(client, fake, '/api/matches', etag)
+    assert response.status_code == 200
+    assert etag_of(response) != etag
+    assert response.get_json()['data']['matches'][0]['lastMessage']['text'] == 'yo'
+
+
+def test_messages_are_not_modified_until_read_or_reacted(client, fake):
+    url = '/api/matches/amy_bob/messages'
+    etag = etag_of(client.get(url, headers=auth('amy')))
+
+    response, queries = revalidate(client, fake, url, etag)
+    assert response.status_code == 304
+    assert queries == 0
+
+    client.post(f'{url}/read', json={'messageIds': ['msg0']}, headers=auth('amy'))
+    response, _ = revalidate(client, fake, url, etag)
+    assert response.status_code == 200
+    read_etag = etag_of(response)
+    assert read_etag != etag
+
+    client.post(f'{url}/msg0/reactions', json={'emoji': '👍'}, headers=auth('bob'))
+    response, _ = revalidate(client, fake, url, read_etag)
+    assert response.status_code == 200
+    assert etag_of(response) != read_etag
+    assert response.get_json()['data']['messages'][0]['reactions'][0]['emoji'] == '👍'
+
+
+def test_incoming_pokes_are_not_modified_until_a_new_poke(client, fake):
+    url = '/api/pokes/incoming'
+    etag = etag_of(client.get(url, headers=auth('amy')))
+
+    response, queries = revalidate(client, fake, url, etag)
+    assert response.status_code == 304
+    assert queries == 0
+
+    client.post('/api/poke/amy', headers=auth('cy'))
+    response, _ = revalidate(client, fake, url, etag)
+    assert response.status_code == 200
+    assert etag_of(response) != etag
+    assert [p['fromUserId'] for p in response.get_json()['data']['pokes']] == ['cy']
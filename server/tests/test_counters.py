@@ -0,0 +1,47 @@
+from unittest.mock import patch
+
+import counters
+
+
+def test_sharded_counter_increment_sum_and_reset(datastore):
+    with patch('counters.get_client', return_value=datastore), \
+            patch('counters.Entity', datastore.Entity):
+        for _ in range(10):
+            counters.increment('unread:m1:u1')
+        counters.increment('unread:m2:u1', amount=3)
+
+        assert counters.get_counts(['unread:m1:u1', 'unread:m2:u1', 'unread:m3:u1']) == {
+            'unread:m1:u1': 10,
+            'unread:m2:u1': 3,
+            'unread:m3:u1': 0,
+        }
+        assert len([k for k in datastore.store if k[1].startswith('unread:m1:u1#')]) <= counters.DEFAULT_SHARDS
+
+        counters.reset('unread:m1:u1')
+        assert counters.get_count('unread:m1:u1') == 0
+        assert counters.get_count('unread:m2:u1') == 3
+
+
+def test_set_count_replaces_every_shard(datastore):
+    with patch('counters.get_client', return_value=datastore), \
+            patch('counters.Entity', datastore.Entity):
+        for _ in range(8):
+            counters.increment('badge')
+        counters.set_count('badge', 2)
+
+        assert counters.get_count('badge') == 2
+        assert [k[1] for k in datastore.store] == ['badge#0']
+
+
+def test_reset_reads_shards_in_the_callers_transaction(datastore):
+    datastore.current_transaction = object()
+    calls = []
+    datastore.get_multi = lambda keys: calls.append('get') or []
+    datastore.delete_multi = lambda keys: calls.append('delete')
+    with patch('counters.get_client', return_value=datastore), \
+            patch('counters.run_in_transaction') as txn:
+        counters.reset('unread:m1:u1')
+
+    # Joins the open transaction; the read puts the shards in its conflict set
+    txn.assert_not_called()
+    assert calls == ['get', 'delete']
@@ -0,0 +1,27 @@
+from unittest.mock import MagicMock
+
+from db import fetch_page
+
+
+def test_fetch_page_returns_entities_and_string_cursor():
+    iterator = MagicMock()
+    iterator.pages = iter([['m1', 'm2']])
+    iterator.next_page_token = b'CjQSLmoQ'
+    query = MagicMock()
+    query.fetch.return_value = iterator
+
+    entities, cursor = fetch_page(query, 2, 'prev-cursor')
+
+    query.fetch.assert_called_once_with(limit=2, start_cursor='prev-cursor')
+    assert entities == ['m1', 'm2']
+    assert cursor == 'CjQSLmoQ'
+
+
+def test_fetch_page_without_more_results_has_no_cursor():
+    iterator = MagicMock()
+    iterator.pages = iter([['m1']])
+    iterator.next_page_token = None
+    query = MagicMock()
+    query.fetch.return_value = iterator
+
+    assert fetch_page(query, 50) == (['m1'], None)
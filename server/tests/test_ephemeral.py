@@ -0,0 +1,69 @@
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from ephemeral import MemoryStore, RedisStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memory_store_expires_entries_after_ttl():
+    clock = FakeClock()
+    store = MemoryStore(clock=clock)
+
+    store.set('typing:m1:u1', True, ttl=10)
+    assert store.get('typing:m1:u1') is True
+
+    clock.now += 9.9
+    assert store.get('typing:m1:u1') is True
+
+    clock.now += 0.2
+    assert store.get('typing:m1:u1') is None
+
+
+def test_memory_store_delete_and_sweep():
+    clock = FakeClock()
+    store = MemoryStore(clock=clock)
+
+    store.set('a', 1, ttl=5)
+    store.set('b', 2, ttl=500)
+    store.delete('b')
+    assert store.get('b', 'missing') == 'missing'
+
+    # A later write past the sweep interval purges expired keys
+    clock.now += MemoryStore.SWEEP_INTERVAL_SECONDS + 1
+    store.set('c', 3, ttl=5)
+    assert 'a' not in store._data
+    assert store.get('c') == 3
+
+
+def test_redis_store_without_redis_package_explains_itself():
+    with patch.dict(sys.modules, {'redis': None}):
+        with pytest.raises(RuntimeError, match='redis package'):
+            RedisStore('redis://localhost:6379/0')
+
+
+def test_redis_store_treats_server_errors_as_unset():
+    class RedisError(Exception):
+        pass
+
+    server = MagicMock()
+    server.get.side_effect = server.set.side_effect = server.delete.side_effect = RedisError('down')
+    redis = SimpleNamespace(Redis=SimpleNamespace(from_url=lambda url: server),
+                            exceptions=SimpleNamespace(RedisError=RedisError))
+
+    with patch.dict(sys.modules, {'redis': redis}):
+        store = RedisStore('redis://localhost:6379/0')
+
+    store.set('typing:m1:u1', True, ttl=10)
+    store.delete('typing:m1:u1')
+    assert store.get('typing:m1:u1') is None
+    assert store.get('typing:m1:u1', False) is False
@@ -0,0 +1,40 @@
+import math
+import random
+
+import pytest
+
+import geo
+
+
+def test_encode_matches_reference_geohash():
+    assert geo.encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    assert geo.cells_for(38.5382, -121.7617) == [
+        geo.encode(38.5382, -121.7617, p) for p in geo.CELL_PRECISIONS
+    ]
+
+
+def test_distance_km_between_davis_and_sacramento():
+    assert geo.distance_km(38.5449, -121.7405, 38.5816, -121.4944) == pytest.approx(21.7, abs=0.3)
+
+
+@pytest.mark.parametrize('radius', [0.3, 1.0, 3.0, 12.0])
+def test_covering_cells_contain_every_point_in_the_radius(radius):
+    rng = random.Random(radius)
+    lat, lng = 38.5382, -121.7617
+    cells = geo.covering_cells(lat, lng, radius)
+    precision = len(cells[0])
+    assert len(cells) == 9
+
+    for _ in range(500):
+        # Random point within `radius` km
+        bearing = rng.uniform(0, 2 * math.pi)
+        dist = radius * math.sqrt(rng.random())
+        plat = lat + dist * math.cos(bearing) / geo.KM_PER_DEGREE
+        plng = lng + dist * math.sin(bearing) / (geo.KM_PER_DEGREE * math.cos(math.radians(lat)))
+        if geo.distance_km(lat, lng, plat, plng) <= radius:
+            assert geo.encode(plat, plng, precision) in cells
+
+
+def test_covering_cells_rejects_radius_beyond_coarsest_cell():
+    with pytest.raises(ValueError):
+        geo.covering_cells(38.5, -121.7, geo.max_radius_km(38.5) + 1)
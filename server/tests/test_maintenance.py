@@ -0,0 +1,38 @@
+from unittest.mock import patch
+
+import maintenance
+
+
+def test_sweeps_retire_dead_data_in_batches(datastore):
+    for i in range(5):
+        datastore.add('Meetup', f'old{i}', status='active', date='2000-01-01')
+    datastore.add('Meetup', 'future', status='active', date='2999-01-01')
+    datastore.add('VerificationCode', '+1555', expiresAt='2000-01-01T00:00:00Z')
+    datastore.add('VerificationCode', '+1556', expiresAt='2999-01-01T00:00:00Z')
+    datastore.add('TypingIndicator', 'm1_u1')
+    datastore.add('Session', 's-old', status='superseded', updatedAt='2000-01-01T00:00:00Z')
+    datastore.add('Session', 's-new', status='superseded', updatedAt='2999-01-01T00:00:00Z')
+    datastore.add('Meetup', 'queued', status='active', date='2999-01-01', participants=['host'])
+    for uid in ['u1', 'u2', 'u3']:
+        datastore.add('MeetupJoinRequest', f'queued_{uid}', meetupId='queued', userId=uid,
+                      status='pending', createdAt=f'2026-03-01T00:00:0{uid[1]}Z')
+
+    with patch('maintenance.get_client', return_value=datastore), \
+            patch('meetup.get_client', return_value=datastore), \
+            patch('meetup.versions.bump'), \
+            patch('maintenance.SWEEP_BATCH_SIZE', 2):
+        metrics = maintenance.run_sweeps()
+
+    assert {name: m['count'] for name, m in metrics.items()} == {
+        'meetups': 5,
+        'verification_codes': 1,
+        'typing_indicators': 1,
+        'superseded_sessions': 1,
+        'join_requests': 3,
+    }
+    assert datastore.store[('Meetup', 'old3')]['status'] == 'expired'
+    assert datastore.store[('Meetup', 'future')]['status'] == 'active'
+    assert datastore.store[('Meetup', 'queued')]['participants'] == ['host', 'u1', 'u2', 'u3']
+    assert {k for k in datastore.store if k[0] != 'MeetupJoinRequest'} == {
+        ('Meetup', f'old{i}') for i in range(5)} | {
+        ('Meetup', 'future'), ('Meetup', 'queued'), ('VerificationCode', '+1556'), ('Session', 's-new')}
@@ -0,0 +1,47 @@
+from unittest.mock import patch
+
+import pytest
+
+from auth import generate_token
+from match import record_last_message
+
+
+@pytest.fixture
+def fake(datastore):
+    datastore.add('Match', 'amy_bob', user1Id='amy', user2Id='bob', userIds=['amy', 'bob'],
+                  status='active', createdAt='2026-01-01T00:00:00Z',
+                  profiles={'bob': {'displayName': 'Bob'}})
+    with patch('match.get_client', return_value=datastore), \
+            patch('match.Entity', datastore.Entity), \
+            patch('match.versions.get_stamps', return_value=['v1']), \
+            patch('match.counters.get_counts', side_effect=lambda names: dict.fromkeys(names, 0)):
+        yield datastore
+
+
+def test_last_message_summary_only_moves_forward(fake):
+    assert record_last_message('amy_bob', 'newer', 'bob', '2026-03-01T10:05:00Z') is True
+    # A late writer with an older message leaves the newer summary alone
+    assert record_last_message('amy_bob', 'older', 'amy', '2026-03-01T10:01:00Z') is False
+
+    activity = fake.store[('MatchActivity', 'amy_bob')]
+    assert activity['lastMessageText'] == 'newer'
+    assert activity['lastMessageCreatedAt'] == '2026-03-01T10:05:00Z'
+
+
+def test_matches_fall_back_to_legacy_last_message_fields(client, fake):
+    fake.add('Match', 'amy_cy', user1Id='amy', user2Id='cy', userIds=['amy', 'cy'],
+             status='active', createdAt='2026-01-02T00:00:00Z', profiles={'cy': {'displayName': 'Cy'}},
+             lastMessageText='old hello', lastMessageSenderId='cy',
+             lastMessageCreatedAt='2026-02-01T00:00:00Z')
+    record_last_message('amy_bob', 'hi', 'bob', '2026-03-01T10:00:00Z')
+
+    headers = {'Authorization': f'Bearer {generate_token("amy")}'}
+    matches = client.get('/api/matches', headers=headers).get_json()['data']['matches']
+
+    assert [(m['id'], m['lastMessage']['text']) for m in matches] == [
+        ('amy_bob', 'hi'),
+        ('amy_cy', 'old hello'),
+    ]
+    assert matches[1]['lastMessage'] == {
+        'text': 'old hello', 'senderId': 'cy', 'createdAt': '2026-02-01T00:00:00Z'
+    }
@@ -0,0 +1,168 @@
+from unittest.mock import patch
+
+import pytest
+
+from auth import generate_token
+import meetup as meetup_module
+
+
+def list_meetups(client, datastore, path, page, headers=None):
+    headers = {'Authorization': f'Bearer {generate_token("u1")}', **(headers or {})}
+    datastore.queries.clear()
+    with patch('meetup.get_client', return_value=datastore), \
+            patch('meetup.fetch_page', return_value=page) as fetch_page:
+        response = client.get(path, headers=headers)
+    query = datastore.queries[0] if datastore.queries else None
+    return response, query, fetch_page
+
+
+@pytest.fixture(autouse=True)
+def empty_feed_cache():
+    meetup_module._feed_cache.clear()
+
+
+def test_list_meetups_filters_and_orders_in_datastore(client, datastore):
+    page = ([datastore.add('Meetup', 'm1', sport='Tennis', date='2099-01-01', time='09:00')], 'next')
+    response, query, fetch_page = list_meetups(client, datastore, '/api/meetups?sport=Tennis&limit=500', page)
+
+    data = response.get_json()['data']
+    assert [m['id'] for m in data['meetups']] == ['m1']
+    assert data['nextCursor'] == 'next'
+    assert query.filters[:2] == [('status', '=', 'active'), ('sportKey', '=', 'tennis')]
+    assert query.filters[2][:2] == ('date', '>=')
+    assert query.order == ['date', 'time']
+    fetch_page.assert_called_once_with(query, 100, None)
+
+
+def test_list_meetups_serves_repeat_requests_from_the_feed_cache(client, datastore):
+    page = ([datastore.add('Meetup', 'm1', sport='Tennis', date='2099-01-01', time='09:00')], None)
+    first, _, _ = list_meetups(client, datastore, '/api/meetups?sport=tennis', page)
+    again, _, fetch_page = list_meetups(client, datastore, '/api/meetups?sport=Tennis', page)
+    revalidated, _, _ = list_meetups(client, datastore, '/api/meetups?sport=Tennis', page,
+                                     headers={'If-None-Match': first.headers['ETag']})
+
+    assert again.data == first.data
+    fetch_page.assert_not_called()
+    assert revalidated.status_code == 304
+
+
+def test_meetup_changes_drop_only_the_feeds_they_appear_on(client, datastore):
+    feeds = ['/api/meetups', '/api/meetups?sport=tennis', '/api/meetups?sport=soccer',
+             '/api/meetups?date=2099-01-01', '/api/meetups?date=2099-01-02']
+    for path in feeds:
+        list_meetups(client, datastore, path, ([], None))
+    changed = datastore.add('Meetup', 'm1', sport='Tennis', sportKey='tennis', date='2099-01-01')
+    with patch('meetup.versions.bump') as bump:
+        meetup_module.meetups_changed(changed, 'u1')
+
+    refetched = [path for path in feeds if list_meetups(client, datastore, path, ([], None))[2].called]
+    assert refetched == ['/api/meetups', '/api/meetups?sport=tennis', '/api/meetups?date=2099-01-01']
+    # No global version to bump, just the participant's calendar
+    bump.assert_called_once_with('calendar:u1')
+
+
+def test_list_meetups_for_a_past_date_skips_the_query(client, datastore):
+    response, _, fetch_page = list_meetups(client, datastore, '/api/meetups?date=2000-01-01', ([], None))
+
+    assert response.get_json()['data'] == {'meetups': [], 'nextCursor': None}
+    fetch_page.assert_not_called()
+
+
+def test_my_meetups_queries_the_participants_index(client, datastore):
+    page = ([datastore.add('Meetup', 'm1', hostId='u2', participants=['u2', 'u1'])], None)
+    response, query, fetch_page = list_meetups(client, datastore, '/api/meetups/mine?upcoming=true', page)
+
+    assert [m['id'] for m in response.get_json()['data']['meetups']] == ['m1']
+    assert query.filters[:2] == [('participants', '=', 'u1'), ('status', '=', 'active')]
+    assert query.filters[2][:2] == ('date', '>=')
+    assert query.order == ['date', 'time']
+    fetch_page.assert_called_once_with(query, 50, None)
+
+
+def add_meetup(datastore, **props):
+    return datastore.add('Meetup', 'm1', **{
+        'hostId': 'host', 'participants': ['host'], 'status': 'active',
+        'date': '2099-01-01', 'playerLimit': 3, **props,
+    })
+
+
+def test_join_is_transactional_and_enforces_the_limit(client, datastore):
+    meetup = add_meetup(datastore, playerLimit=2)
+    with patch('meetup.get_client', return_value=datastore), \
+            patch('meetup.versions.bump'):
+        first = client.post('/api/meetups/m1/join',
+                            headers={'Authorization': f'Bearer {generate_token("u1")}'})
+        second = client.post('/api/meetups/m1/join',
+                             headers={'Authorization': f'Bearer {generate_token("u2")}'})
+
+    assert first.status_code == 200
+    assert second.get_json()['error']['code'] == 'MEETUP_FULL'
+    assert meetup['participants'] == ['host', 'u1']
+
+
+def test_queue_mode_admits_requests_in_order_up_to_the_limit(client, datastore):
+    meetup = add_meetup(datastore, joinMode='queue')
+    with patch('meetup.get_client', return_value=datastore), \
+            patch('meetup.Entity', datastore.Entity), \
+            patch('meetup.versions.bump'), \
+            patch('meetup.tasks.defer') as defer:
+        joined = {}
+        for uid in ['u1', 'u2', 'u3', 'u1']:
+            response = client.post('/api/meetups/m1/join',
+                                   headers={'Authorization': f'Bearer {generate_token(uid)}'})
+            assert response.status_code == 202
+            joined.setdefault(uid, response.get_json()['data']['joinRequest']['createdAt'])
+            # Joining again keeps the original place in the queue
+            assert response.get_json()['data']['joinRequest']['createdAt'] == joined[uid]
+
+        assert meetup['participants'] == ['host']
+        # One admission loop for the whole rush
+        defer.assert_called_once_with(meetup_module._run_admissions, 'm1')
+
+        with patch('meetup.admit_join_requests', wraps=meetup_module.admit_join_requests) as admit:
+            meetup_module._run_admissions('m1')
+        # The joins after the first asked for one more pass
+        assert admit.call_count == 2
+        assert meetup_module._admissions == {}
+
+    assert meetup['participants'] == ['host', 'u1', 'u2']
+    assert datastore.store[('MeetupJoinRequest', 'm1_u3')]['reason'] == 'MEETUP_FULL'
+
+
+def test_my_meetups_history_includes_expired(client, datastore):
+    _, query, _ = list_meetups(client, datastore, '/api/meetups/mine', ([], None))
+
+    assert query.filters == [('participants', '=', 'u1'), ('status', 'IN', ['active', 'expired'])]
+
+
+def test_participants_come_from_one_batched_read_without_pictures(client, datastore):
+    add_meetup(datastore, participants=['host', 'u1', 'gone'])
+    for uid, picture in [('host', 'data:image/png;base64,AAAA'), ('u1', None)]:
+        datastore.add('User', uid, displayName=uid, profilePicture=picture)
+    headers = {'Authorization': f'Bearer {generate_token("u1")}'}
+
+    with patch('meetup.get_client', return_value=datastore):
+        summary = client.get('/api/meetups/m1/participants', headers=headers).get_json()['data']
+        full = client.get('/api/meetups/m1/participants?include=picture', headers=headers).get_json()['data']
+
+    assert datastore.get_multi_calls == 2
+    assert [p['id'] for p in summary['participants']] == ['host', 'u1']
+    assert 'profilePicture' not in summary['participants'][0]
+    assert summary['participants'][0]['profilePictureUrl'] == '/api/auth/users/host/picture'
+    assert summary['participants'][1]['profilePictureUrl'] is None
+    assert full['participants'][0]['profilePicture'] == 'data:image/png;base64,AAAA'
+
+
+def test_feed_fills_lock_per_key():
+    tennis = ('2099-01-01', 'tennis', '', '', 50)
+    soccer = ('2099-01-01', 'soccer', '', '', 50)
+    locks = meetup_module._feed_fill_locks
+
+    with meetup_module._feed_fill_lock(tennis):
+        # A fill for another feed does not wait on this one
+        with meetup_module._feed_fill_lock(soccer):
+            assert locks[tennis][0] is not locks[soccer][0]
+        assert soccer not in locks
+        assert locks[tennis][0].locked()
+
+    assert locks == {}
@@ -0,0 +1,108 @@
+from unittest.mock import patch
+
+import pytest
+
+from auth import generate_token
+from match import derive_read_by
+
+
+@pytest.fixture
+def fake(datastore):
+    datastore.add('Match', 'm1', user1Id='amy', user2Id='bob', userIds=['amy', 'bob'])
+    for i in range(4):
+        datastore.add('Message', f'msg{i}', matchId='m1', senderId='amy', text=str(i),
+                      createdAt=f'2026-03-01T10:0{i}:00Z')
+    with patch('match.get_client', return_value=datastore), \
+            patch('match.Entity', datastore.Entity), \
+            patch('match.versions.get_stamps', return_value=['v1']):
+        yield datastore
+
+
+def page(client, query):
+    headers = {'Authorization': f'Bearer {generate_token("bob")}'}
+    return client.get(f'/api/matches/m1/messages?{query}', headers=headers).get_json()['data']
+
+
+def test_has_more_only_when_older_messages_exist(client, fake):
+    latest = page(client, 'limit=2')
+    assert [m['id'] for m in latest['messages']] == ['msg2', 'msg3']
+    assert latest['hasMore'] is True
+
+    # Exactly a full page left: it is the last one
+    oldest = page(client, 'limit=2&before=2026-03-01T10:02:00Z')
+    assert [m['id'] for m in oldest['messages']] == ['msg0', 'msg1']
+    assert oldest['hasMore'] is False
+
+
+def react(client, user_id, message_id, emoji, remove=False):
+    headers = {'Authorization': f'Bearer {generate_token(user_id)}'}
+    url = f'/api/matches/m1/messages/{message_id}/reactions'
+    if remove:
+        return client.delete(f'{url}/{emoji}', headers=headers)
+    return client.post(url, json={'emoji': emoji}, headers=headers)
+
+
+def test_reactions_are_added_once_and_removed(client, fake):
+    with patch('match.versions.bump'):
+        first = react(client, 'bob', 'msg1', '👍').get_json()['data']['reaction']
+        again = react(client, 'bob', 'msg1', '👍').get_json()['data']['reaction']
+        react(client, 'amy', 'msg1', '👍')
+        assert react(client, 'bob', 'msg1', '🙃').status_code == 400
+        assert react(client, 'bob', 'nope', '👍').status_code == 404
+
+        assert again['createdAt'] == first['createdAt']
+        assert set(fake.store[('Message', 'msg1')]['reactions']['👍']) == {'amy', 'bob'}
+
+        assert react(client, 'bob', 'msg1', '👍', remove=True).status_code == 200
+        assert list(fake.store[('Message', 'msg1')]['reactions']['👍']) == ['amy']
+
+
+def test_removing_a_legacy_reaction_deletes_its_row(client, fake):
+    fake.add('MessageReaction', 'msg1_bob_👍', messageId='msg1', matchId='m1', userId='bob', emoji='👍')
+
+    with patch('match.versions.bump'):
+        assert react(client, 'bob', 'msg1', '👍', remove=True).status_code == 200
+
+    assert ('MessageReaction', 'msg1_bob_👍') not in fake.store
+
+
+def mark_read(client, user_id, message_ids):
+    headers = {'Authorization': f'Bearer {generate_token(user_id)}'}
+    with patch('match.bump_match_versions'), patch('match.counters.reset'):
+        response = client.post('/api/matches/m1/messages/read', json={'messageIds': message_ids},
+                               headers=headers)
+    return response.get_json()['data']['updatedCount']
+
+
+def test_marking_read_is_one_watermark_write(client, fake):
+    puts = []
+    real_put = fake.put
+    fake.put = lambda entity: (puts.append(entity.key.kind), real_put(entity))
+
+    assert mark_read(client, 'bob', ['msg0', 'msg1', 'msg2']) == 3
+
+    assert puts == ['ReadState']
+    assert fake.store[('ReadState', 'm1_bob')]['lastReadAt'] == '2026-03-01T10:02:00Z'
+
+
+def test_watermark_only_moves_forward(client, fake):
+    assert mark_read(client, 'bob', ['msg2']) == 1
+    # Older messages are already covered by the watermark
+    assert mark_read(client, 'bob', ['msg0', 'msg1']) == 0
+    assert fake.store[('ReadState', 'm1_bob')]['lastReadAt'] == '2026-03-01T10:02:00Z'
+    # Only listed messages past the watermark count; own messages never do
+    assert mark_read(client, 'bob', ['msg1', 'msg2', 'msg3']) == 1
+    assert mark_read(client, 'amy', ['msg3']) == 0
+
+
+def test_read_by_combines_watermarks_and_legacy_lists():
+    watermarks = {'amy': '2026-03-01T10:03:00Z', 'bob': '2026-03-01T10:01:00Z'}
+
+    read = {'senderId': 'amy', 'createdAt': '2026-03-01T10:01:00Z'}
+    unread = {'senderId': 'amy', 'createdAt': '2026-03-01T10:02:00Z'}
+    legacy = {'senderId': 'amy', 'createdAt': '2026-03-01T10:02:00Z', 'readBy': ['amy', 'bob']}
+
+    assert derive_read_by(read, watermarks) == ['amy', 'bob']
+    assert derive_read_by(unread, watermarks) == ['amy']
+    assert derive_read_by(legacy, watermarks) == ['amy', 'bob']
+    assert derive_read_by(unread, {}) == ['amy']
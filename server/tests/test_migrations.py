@@ -0,0 +1,114 @@
+from unittest.mock import patch
+
+import migrations
+
+
+def test_run_migration_backfills_in_batches_and_checkpoints(datastore):
+    for i in range(5):
+        datastore.add('Match', f'm{i}', user1Id=f'a{i}', user2Id=f'b{i}')
+    datastore.store[('Match', 'm2')]['userIds'] = ['a2', 'b2']
+
+    with patch('migrations.get_client', return_value=datastore), \
+            patch('migrations.fetch_page', datastore.fetch_page), \
+            patch('migrations.Entity', datastore.Entity):
+        result = migrations.run_migration('match_user_ids', batch_size=2, parallelism=2)
+
+        assert result['processed'] == 5
+        assert result['updated'] == 4
+        assert datastore.get(datastore.key('Match', 'm4'))['userIds'] == ['a4', 'b4']
+
+        state = migrations.load_state('match_user_ids')
+        assert state['done'] is True
+        assert state['cursor'] is None
+
+        # A completed migration is not re-run
+        assert migrations.run_migration('match_user_ids')['processed'] == 5
+
+
+def test_run_migration_resumes_from_checkpoint(datastore):
+    for i in range(4):
+        datastore.add('Session', f's{i}', proposerId=f'p{i}', responderId=f'r{i}')
+    datastore.add('MigrationState', 'session_user_ids', cursor='2', processed=2, updated=2, done=False)
+
+    with patch('migrations.get_client', return_value=datastore), \
+            patch('migrations.fetch_page', datastore.fetch_page), \
+            patch('migrations.Entity', datastore.Entity):
+        result = migrations.run_migration('session_user_ids', batch_size=2)
+
+    assert result['processed'] == 4
+    assert 'userIds' not in datastore.get(datastore.key('Session', 's0'))
+    assert datastore.get(datastore.key('Session', 's3'))['userIds'] == ['p3', 'r3']
+
+
+def test_self_writing_migrations_report_what_they_wrote(datastore):
+    for i in range(3):
+        datastore.add('User', f'u{i}')
+
+    with patch('migrations.get_client', return_value=datastore), \
+            patch('migrations.fetch_page', datastore.fetch_page), \
+            patch('migrations.Entity', datastore.Entity), \
+            patch('migrations.counters.set_count') as set_count:
+        result = migrations.run_migration('incoming_poke_counts', batch_size=2)
+
+    assert set_count.call_count == 3
+    assert result['updated'] == 3
+    assert datastore.store[('MigrationState', 'incoming_poke_counts')]['updated'] == 3
+
+
+def test_batches_are_rewritten_from_a_fresh_read(datastore):
+    datastore.add('Session', 's0', status='pending', date='2026-03-06', startHour=9,
+                  day='Friday', createdAt='2026-03-01T00:00:00Z')
+
+    def fetch_then_accept(query, limit, cursor=None):
+        page = datastore.fetch_page(query, limit, cursor)
+        # The user accepts the session after the migration read it
+        datastore.store[('Session', 's0')]['status'] = 'accepted'
+        return page
+
+    with patch('migrations.get_client', return_value=datastore), \
+            patch('migrations.fetch_page', fetch_then_accept), \
+            patch('migrations.Entity', datastore.Entity):
+        result = migrations.run_migration('session_starts_at')
+
+    session = datastore.store[('Session', 's0')]
+    assert session['status'] == 'accepted'
+    assert session['startsAt']
+    assert result['updated'] == 1
+
+
+def test_poke_status_marks_matched_and_pending_pokes(datastore):
+    datastore.add('Match', 'a_b', userIds=['a', 'b'], user1Id='a', user2Id='b', status='active')
+    datastore.add('Poke', 'a_b', fromUserId='a', toUserId='b')
+    datastore.add('Poke', 'c_b', fromUserId='c', toUserId='b')
+
+    with patch('migrations.get_client', return_value=datastore), \
+            patch('migrations.fetch_page', datastore.fetch_page), \
+            patch('migrations.Entity', datastore.Entity):
+        result = migrations.run_migration('poke_status')
+
+    assert datastore.store[('Poke', 'a_b')]['status'] == 'matched'
+    assert datastore.store[('Poke', 'c_b')]['status'] == 'pending'
+    assert result['updated'] == 2
+
+
+def test_reaction_backfill_folds_and_deletes_legacy_rows(datastore):
+    datastore.add('Message', 'msg1', matchId='m1', reactions={'👍': {'amy': '2026-01-02T00:00:00Z'}})
+    datastore.add('MessageReaction', 'msg1_bob_👍', messageId='msg1', matchId='m1', userId='bob',
+                  emoji='👍', createdAt='2026-01-01T00:00:00Z')
+    datastore.add('MessageReaction', 'gone_bob_👍', messageId='gone', matchId='m1', userId='bob',
+                  emoji='👍', createdAt='2026-01-01T00:00:00Z')
+
+    with patch('migrations.get_client', return_value=datastore), \
+            patch('compaction.get_client', return_value=datastore), \
+            patch('migrations.fetch_page', datastore.fetch_page), \
+            patch('migrations.Entity', datastore.Entity):
+        result = migrations.run_migration('message_reaction_aggregates')
+        # A restart finds nothing left to fold
+        again = migrations.run_migration('message_reaction_aggregates', restart=True)
+
+    assert datastore.store[('Message', 'msg1')]['reactions'] == {
+        '👍': {'amy': '2026-01-02T00:00:00Z', 'bob': '2026-01-01T00:00:00Z'}
+    }
+    assert not any(kind == 'MessageReaction' for kind, _ in datastore.store)
+    assert result['updated'] == 2
+    assert again['processed'] == 0
@@ -0,0 +1,58 @@
+import pytest
+
+from models import reactions_to_list, profile_snapshot, session_starts_at, utc_timestamp
+
+
+def test_reactions_to_list_flattens_aggregate_oldest_first():
+    aggregate = {
+        '👍': {'u1': '2026-03-01T10:00:02Z', 'u2': '2026-03-01T10:00:00Z'},
+        '😂': {'u1': '2026-03-01T10:00:01Z'},
+    }
+
+    reactions = reactions_to_list(aggregate)
+
+    assert [(r['emoji'], r['userId']) for r in reactions] == [
+        ('👍', 'u2'), ('😂', 'u1'), ('👍', 'u1'),
+    ]
+    assert reactions_to_list(None) == []
+
+
+def test_profile_snapshot_excludes_picture_and_carries_version():
+    user = {
+        'displayName': 'Sam',
+        'major': 'Economics',
+        'sports': [{'sport': 'Tennis', 'skillLevel': 'Beginner'}],
+        'profilePicture': 'data:image/jpeg;base64,AAAA',
+        'passwordHash': 'secret',
+        'createdAt': '2026-01-01T00:00:00Z',
+        'updatedAt': '2026-02-01T00:00:00Z',
+    }
+
+    snapshot = profile_snapshot(user)
+
+    assert snapshot['displayName'] == 'Sam'
+    assert snapshot['updatedAt'] == '2026-02-01T00:00:00Z'
+    assert 'profilePicture' not in snapshot
+    assert 'passwordHash' not in snapshot
+
+
+def test_session_starts_at_uses_the_configured_timezone():
+    # 6pm Pacific daylight time is 01:00 UTC the next day
+    assert session_starts_at('2026-07-04', 18) == '2026-07-05T01:00:00Z'
+    # Standard time is UTC-8
+    assert session_starts_at('2026-01-10', 9) == '2026-01-10T17:00:00Z'
+
+
+def test_session_starts_at_without_date_uses_next_weekday():
+    # 2026-03-04 is a Wednesday
+    assert session_starts_at('', 10, 'Friday', '2026-03-04T20:00:00Z') == '2026-03-06T18:00:00Z'
+    assert session_starts_at('', 10, 'Someday') is None
+    assert session_starts_at('2026-03-06', None) is None
+
+
+def test_utc_timestamp_normalizes_offsets_and_rejects_garbage():
+    assert utc_timestamp('2026-03-06T09:00:00-08:00') == '2026-03-06T17:00:00Z'
+    assert utc_timestamp('2026-03-06T17:00:00.123456Z') == '2026-03-06T17:00:00Z'
+    assert utc_timestamp('2026-03-06') == '2026-03-06T00:00:00Z'
+    with pytest.raises(ValueError):
+        utc_timestamp('next tuesday')
@@ -0,0 +1,98 @@
+from unittest.mock import patch
+
+import pytest
+
+from auth import generate_token
+
+
+@pytest.fixture
+def fake(datastore):
+    for user_id, name in [('bob', 'Bob'), ('amy', 'Amy')]:
+        datastore.add('User', user_id, displayName=name, updatedAt='2026-01-01T00:00:00Z')
+    with patch('match.get_client', return_value=datastore), \
+            patch('match.Entity', datastore.Entity), \
+            patch('match.versions.bump') as bump, \
+            patch('match.counters.increment') as increment:
+        datastore.increment = increment
+        datastore.bump = bump
+        yield datastore
+
+
+def poke(client, from_id, to_id):
+    headers = {'Authorization': f'Bearer {generate_token(from_id)}'}
+    return client.post(f'/api/poke/{to_id}', headers=headers).get_json()['data']
+
+
+def test_mutual_poke_creates_one_match_under_the_pair_key(client, fake):
+    assert poke(client, 'bob', 'amy')['status'] == 'poked'
+    assert poke(client, 'bob', 'amy')['status'] == 'already_poked'
+
+    matched = poke(client, 'amy', 'bob')
+    assert matched['status'] == 'matched'
+    assert matched['match']['id'] == 'amy_bob'
+    assert matched['match']['partnerName'] == 'Bob'
+
+    match = fake.store[('Match', 'amy_bob')]
+    assert match['userIds'] == ['amy', 'bob']
+    assert set(match['profiles']) == {'amy', 'bob'}
+    assert [k for k in fake.store if k[0] == 'Match'] == [('Match', 'amy_bob')]
+    # Each poke is decided from a single batched read
+    assert fake.get_multi_calls == 3
+
+    # Amy's badge went up for Bob's poke and back down once they matched
+    assert fake.store[('Poke', 'bob_amy')]['status'] == 'matched'
+    assert fake.store[('Poke', 'amy_bob')]['status'] == 'matched'
+    assert [c.args for c in fake.increment.call_args_list] == [
+        ('incoming_pokes:amy',),
+        ('incoming_pokes:amy', -1),
+    ]
+
+
+def test_poke_restarts_a_leftover_pair_match(client, fake):
+    poke(client, 'bob', 'amy')
+    existing = fake.add('Match', 'amy_bob', userIds=['bob', 'amy'], status='ended',
+                        profiles={}, createdAt='2026-02-01T00:00:00Z')
+    fake.add('ActiveSession', 'amy_bob', matchId='amy_bob', sessionId='s-old')
+
+    matched = poke(client, 'amy', 'bob')
+
+    assert fake.store[('Match', 'amy_bob')] is existing
+    assert existing['status'] == 'active'
+    assert fake.store[('ActiveSession', 'amy_bob')]['sessionId'] is None
+    assert set(existing['profiles']) == {'amy', 'bob'}
+    assert matched['match']['createdAt'] != '2026-02-01T00:00:00Z'
+
+
+def test_reset_deletes_everything_stored_under_the_match(client, fake):
+    poke(client, 'bob', 'amy')
+    poke(client, 'amy', 'bob')
+    for kind in ['Message', 'MessageBlock', 'Session', 'ReadState']:
+        fake.add(kind, f'{kind}-1', matchId='amy_bob')
+    fake.add('MatchActivity', 'amy_bob')
+    fake.add('CounterShard', 'unread:amy_bob:bob#0', name='unread:amy_bob:bob', count=2)
+
+    headers = {'Authorization': f'Bearer {generate_token("amy")}'}
+    with patch('auth.get_client', return_value=fake), \
+            patch('counters.get_client', return_value=fake):
+        data = client.post('/api/admin/reset', headers=headers).get_json()['data']
+
+    assert data == {'deletedPokes': 2, 'deletedMatches': 1}
+    assert set(fake.store) == {('User', 'amy'), ('User', 'bob')}
+    # Bob's calendar loses the pair's sessions
+    assert 'calendar:bob' in fake.bump.call_args.args
+
+
+def test_poke_unknown_user_is_404(client, fake):
+    headers = {'Authorization': f'Bearer {generate_token("bob")}'}
+    response = client.post('/api/poke/nobody', headers=headers)
+    assert response.status_code == 404
+    assert ('Poke', 'bob_nobody') not in fake.store
+
+
+def test_incoming_poke_count_reads_the_badge_counter(client):
+    headers = {'Authorization': f'Bearer {generate_token("amy")}'}
+    with patch('match.counters.get_count', return_value=4) as get_count:
+        response = client.get('/api/pokes/incoming/count', headers=headers)
+
+    assert response.get_json()['data'] == {'count': 4}
+    get_count.assert_called_once_with('incoming_pokes:amy', shards=1)
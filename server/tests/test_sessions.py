@@ -0,0 +1,120 @@
+from unittest.mock import patch
+
+import pytest
+
+from auth import generate_token
+
+
+@pytest.fixture
+def fake(datastore):
+    datastore.add('Match', 'm1', user1Id='amy', user2Id='bob', userIds=['amy', 'bob'],
+                  status='active')
+    datastore.add('ActiveSession', 'm1', matchId='m1', sessionId=None)
+    with patch('match.get_client', return_value=datastore), \
+            patch('match.Entity', datastore.Entity), \
+            patch('match.get_user_by_id', return_value=None), \
+            patch('match.record_last_message'), \
+            patch('match.counters.increment'), \
+            patch('match.bump_match_versions'):
+        yield datastore
+
+
+def propose(client, user_id, hour):
+    headers = {'Authorization': f'Bearer {generate_token(user_id)}'}
+    body = {'sport': 'Tennis', 'day': 'Friday', 'date': '2026-03-06', 'startHour': hour, 'endHour': hour + 1}
+    return client.post('/api/matches/m1/sessions', json=body, headers=headers).get_json()['data']['session']
+
+
+def respond(client, user_id, session_id, action):
+    headers = {'Authorization': f'Bearer {generate_token(user_id)}'}
+    return client.put(f'/api/matches/m1/sessions/{session_id}', json={'action': action}, headers=headers)
+
+
+def test_proposals_supersede_through_the_pointer(client, fake):
+    match = fake.store[('Match', 'm1')]
+    first = propose(client, 'amy', 9)
+    second = propose(client, 'bob', 10)
+
+    assert fake.store[('ActiveSession', 'm1')]['sessionId'] == second['id']
+    assert fake.store[('Session', first['id'])]['status'] == 'superseded'
+    assert second['isChangeProposal'] is True
+    # No scan of the match's session history, and the Match isn't rewritten
+    assert fake.queries == []
+    assert fake.store[('Match', 'm1')] is match and 'activeSessionId' not in match
+
+    headers = {'Authorization': f'Bearer {generate_token("amy")}'}
+    active = client.get('/api/matches/m1/session', headers=headers).get_json()['data']['session']
+    assert active['id'] == second['id']
+
+
+def test_legacy_match_is_looked_up_before_the_transaction(client, fake):
+    del fake.store[('ActiveSession', 'm1')]
+    fake.add('Session', 'old', matchId='m1', status='accepted', createdAt='2026-03-01T00:00:00Z')
+
+    session = propose(client, 'amy', 9)
+
+    assert fake.store[('Session', 'old')]['status'] == 'superseded'
+    assert fake.store[('ActiveSession', 'm1')]['sessionId'] == session['id']
+    assert len(fake.queries) == 1
+
+
+def test_proposal_for_a_deleted_match_is_not_found(client, fake):
+    with patch('match.get_match_for_user', return_value=(fake.store[('Match', 'm1')], 'bob')):
+        del fake.store[('Match', 'm1')]
+        headers = {'Authorization': f'Bearer {generate_token("amy")}'}
+        body = {'sport': 'Tennis', 'day': 'Friday', 'startHour': 9, 'endHour': 10}
+        response = client.post('/api/matches/m1/sessions', json=body, headers=headers)
+
+    assert response.status_code == 404
+    assert response.get_json()['error']['code'] == 'MATCH_NOT_FOUND'
+    assert not any(kind == 'Session' for kind, _ in fake.store)
+
+
+def test_cancel_clears_the_pointer(client, fake):
+    session = propose(client, 'amy', 9)
+    headers = {'Authorization': f'Bearer {generate_token("bob")}'}
+    client.delete(f'/api/matches/m1/sessions/{session["id"]}', headers=headers)
+
+    assert fake.store[('ActiveSession', 'm1')]['sessionId'] is None
+    active = client.get('/api/matches/m1/session', headers=headers).get_json()['data']['session']
+    assert active is None
+
+
+def test_decline_clears_the_pointer_and_accept_keeps_it(client, fake):
+    first = propose(client, 'amy', 9)
+    assert respond(client, 'bob', first['id'], 'decline').status_code == 200
+    assert fake.store[('ActiveSession', 'm1')]['sessionId'] is None
+
+    second = propose(client, 'amy', 10)
+    third = propose(client, 'amy', 11)
+    assert respond(client, 'bob', third['id'], 'accept').status_code == 200
+    assert fake.store[('ActiveSession', 'm1')]['sessionId'] == third['id']
+    # Superseded versions stay for the maintenance sweep; no cleanup query
+    assert fake.store[('Session', second['id'])]['status'] == 'superseded'
+    assert fake.queries == []
+
+
+def test_only_the_responder_can_accept(client, fake):
+    session = propose(client, 'amy', 9)
+    response = respond(client, 'amy', session['id'], 'accept')
+
+    assert response.status_code == 403
+    assert fake.store[('Session', session['id'])]['status'] == 'pending'
+
+
+def test_upcoming_window_is_normalized_to_utc(client, fake):
+    fake.add('Session', 's1', userIds=['amy', 'bob'], status='accepted', startsAt='2026-03-06T17:00:00Z')
+    fake.add('Session', 's2', userIds=['amy', 'bob'], status='accepted', startsAt='2026-03-06T19:00:00Z')
+    headers = {'Authorization': f'Bearer {generate_token("amy")}'}
+
+    with patch('match.fetch_page', fake.fetch_page):
+        # 10:00-11:00 Pacific is 17:00-18:00 UTC
+        response = client.get('/api/sessions/upcoming?from=2026-03-06T10:00:00-07:00'
+                              '&to=2026-03-06T11:00:00-07:00', headers=headers)
+        garbage = client.get('/api/sessions/upcoming?from=tomorrow', headers=headers)
+
+    assert [s['id'] for s in response.get_json()['data']['sessions']] == ['s1']
+    assert fake.queries[-1].filters[2:] == [('startsAt', '>=', '2026-03-06T17:00:00Z'),
+                                            ('startsAt', '<', '2026-03-06T18:00:00Z')]
+    assert garbage.status_code == 400
+    assert garbage.get_json()['error']['code'] == 'VALIDATION_ERROR'
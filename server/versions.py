@@ -0,0 +1,68 @@
+"""Version stamps and ETag helpers for conditional GETs on polled endpoints.
+
+A scope (e.g. "matches:{userId}") names a slice of data a response depends
+on. Writers bump the scope with a blind put of a fresh token; readers fetch
+all the stamps they need in one lookup, hash them into an ETag and answer
+304 Not Modified before running any expensive queries.
+"""
+import hashlib
+import uuid
+from datetime import datetime
+
+from flask import request, make_response
+
+from db import get_client, Entity
+
+
+def bump(*scopes):
+    """Mark every scope as changed."""
+    scopes = [s for s in dict.fromkeys(scopes) if s]
+    if not scopes:
+        return
+    client = get_client()
+    now = datetime.utcnow().isoformat() + 'Z'
+    entities = []
+    for scope in scopes:
+        entity = Entity(client.key('Version', scope))
+        entity.update({'token': uuid.uuid4().hex, 'updatedAt': now})
+        entities.append(entity)
+    client.put_multi(entities)
+
+
+def get_stamps(*scopes):
+    """Current tokens for the given scopes, in order ('' if never bumped)."""
+    client = get_client()
+    found = {
+        e.key.name: e.get('token')
+        for e in client.get_multi([client.key('Version', s) for s in scopes]) if e
+    }
+    return [found.get(s) or '' for s in scopes]
+
+
+def get_version(scope):
+    """(token, updatedAt) for one scope; ('', None) if never bumped."""
+    client = get_client()
+    entity = client.get(client.key('Version', scope))
+    if not entity:
+        return '', None
+    return entity.get('token') or '', entity.get('updatedAt')
+
+
+def compute_etag(*parts):
+    """Strong ETag over the given parts."""
+    return hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+
+def not_modified(etag):
+    """A 304 response if the client already holds `etag`, otherwise None."""
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+    return None
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response